@@ -0,0 +1,299 @@
+"""
+Offline benchmark for the statement analysis pipeline.
+
+Generates synthetic lattice-style statement PDFs (ruled tables with a Date, Description,
+Reference and Amount column) and times each stage of the analysis separately:
+PDF table extraction with Camelot, text-layer extraction, table concat, column inference,
+amount cleaning, merchant normalization, categorization and top-N. Results are written as
+JSON and can be compared against an earlier run.
+
+Usage:
+    python benchmark.py --pages 1 5 20 --rows-per-page 30 --output bench.json
+    python benchmark.py --baseline bench.json --tolerance 0.25 --min-delta-ms 5   # exits 1 on a regression
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+import credit_card_statement_analyzer as analyzer
+
+STAGES = ['extraction', 'text_extraction', 'concat', 'column_inference', 'amount_cleaning', 'merchant_normalization', 'categorization',
+          'top_n']
+
+DEFAULT_MERCHANT_MIX = {
+    "SWIGGY*INSTAMART BANGALORE IN": 3,
+    "ZOMATO ONLINE ORDER GURGAON": 3,
+    "BLINKIT GURGAON IN": 2,
+    "AMAZON PAY INDIA PRIVATE": 2,
+    "UBER INDIA SYSTEMS PVT": 1,
+    "BPCL FUEL STATION MUMBAI": 1,
+    "NETFLIX.COM": 1,
+}
+
+HEADER = ["Date", "Description", "Reference", "Amount (INR)"]
+COLUMN_WIDTHS = [70, 280, 90, 80] # Points; the page is A4 portrait (595 x 842)
+
+
+def synthetic_statement_rows(pages, rows_per_page, merchant_mix=None, seed=0):
+    """
+    Generates the cell text of a synthetic statement.
+
+    Args:
+        pages (int): Number of transaction pages.
+        rows_per_page (int): Transactions per page.
+        merchant_mix (dict, optional): {description: relative weight}. Defaults to DEFAULT_MERCHANT_MIX.
+        seed (int, optional): Seed for reproducible output.
+
+    Returns:
+        list: One list of rows per page, each row a list of cell strings. The first row
+              of every page is the header.
+    """
+    merchant_mix = merchant_mix or DEFAULT_MERCHANT_MIX
+    rng = random.Random(seed)
+    merchants = list(merchant_mix)
+    weights = [merchant_mix[m] for m in merchants]
+
+    statement = []
+    for page in range(pages):
+        rows = [HEADER]
+        for i in range(rows_per_page):
+            day = (page * rows_per_page + i) % 28 + 1
+            amount = rng.randint(50, 25000) + rng.randint(0, 99) / 100
+            rows.append([
+                f"{day:02d}/01/2025",
+                rng.choices(merchants, weights)[0],
+                f"{rng.randint(10 ** 9, 10 ** 10 - 1)}",
+                f"{amount:,.2f}",
+            ])
+        statement.append(rows)
+    return statement
+
+
+def _pdf_text(text):
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def _page_content(rows, row_height=18, left=20, top=800):
+    """
+    Draws one page of rows as a fully ruled table, which is what Camelot's lattice mode detects.
+    """
+    ops = ['0.5 w']
+    right = left + sum(COLUMN_WIDTHS)
+    bottom = top - row_height * len(rows)
+    for r in range(len(rows) + 1):
+        y = top - r * row_height
+        ops.append(f"{left} {y} m {right} {y} l S")
+    x = left
+    for width in [0] + COLUMN_WIDTHS:
+        x += width
+        ops.append(f"{x} {top} m {x} {bottom} l S")
+
+    ops.append('BT /F1 8 Tf')
+    for r, row in enumerate(rows):
+        x = left
+        for width, cell in zip(COLUMN_WIDTHS, row):
+            ops.append(f"1 0 0 1 {x + 3} {top - (r + 1) * row_height + 6} Tm ({_pdf_text(cell)}) Tj")
+            x += width
+    ops.append('ET')
+    return '\n'.join(ops).encode('latin-1')
+
+
+def write_synthetic_pdf(path, statement):
+    """
+    Writes a minimal PDF with one ruled transaction table per page, using only the standard
+    Helvetica font so no external PDF library is needed.
+
+    Args:
+        path (str): Where to write the PDF.
+        statement (list): Pages of rows, as returned by synthetic_statement_rows.
+    """
+    page_count = len(statement)
+    # Object numbers: 1 catalog, 2 page tree, 3 font, then a (page, content) pair per page
+    objects = {
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        2: ("<< /Type /Pages /Count %d /Kids [%s] >>" % (
+            page_count, ' '.join(f"{4 + 2 * i} 0 R" for i in range(page_count)))).encode(),
+        3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    }
+    for i, rows in enumerate(statement):
+        page_obj, content_obj = 4 + 2 * i, 5 + 2 * i
+        objects[page_obj] = (f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                             f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_obj} 0 R >>").encode()
+        content = _page_content(rows)
+        objects[content_obj] = b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content)
+
+    with open(path, 'wb') as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = {}
+        for number in sorted(objects):
+            offsets[number] = f.tell()
+            f.write(b"%d 0 obj\n%s\nendobj\n" % (number, objects[number]))
+        xref_offset = f.tell()
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for number in sorted(objects):
+            f.write(b"%010d 00000 n \n" % offsets[number])
+        f.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_offset))
+
+
+def _timed(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return result, timings
+
+
+def benchmark_statement(pages, rows_per_page, merchant_mix=None, repeat=5, skip_extraction=False, workdir=None):
+    """
+    Times every pipeline stage on one synthetic statement.
+
+    Args:
+        pages (int): Number of transaction pages.
+        rows_per_page (int): Transactions per page.
+        merchant_mix (dict, optional): {description: relative weight}.
+        repeat (int, optional): How often each stage is timed.
+        skip_extraction (bool, optional): Feed the generated cells straight into the later
+            stages instead of extracting them from the PDF (e.g. when Ghostscript isn't installed).
+        workdir (str, optional): Where to write the PDF. Defaults to a temporary directory.
+
+    Returns:
+        dict: The statement parameters and {stage: {'median_s', 'min_s', 'runs'}}.
+    """
+    statement = synthetic_statement_rows(pages, rows_per_page, merchant_mix)
+    workdir = workdir or tempfile.mkdtemp(prefix='statement-bench-')
+    pdf_path = os.path.join(workdir, f"Jan_2025_Synthetic_{pages}p.pdf")
+    write_synthetic_pdf(pdf_path, statement)
+    rules = analyzer.CategoryRules(analyzer.DEFAULT_CATEGORY_RULES)
+    timings = {}
+
+    if skip_extraction:
+        page_tables = [[pd.DataFrame(rows)] for rows in statement]
+    else:
+        # Extraction is timed without the table cache, otherwise every repeat after the first would be a cache hit
+        page_tables, timings['extraction'] = _timed(
+            lambda: [analyzer.extract_tables(pdf_path, pages=str(p), flavor='lattice', cache_dir=None)
+                     for p in range(1, pages + 1)],
+            repeat)
+    # The text-layer parser only needs pypdf, so it is timed even when Camelot is skipped
+    _, timings['text_extraction'] = _timed(lambda: analyzer.TextLayerExtractor().extract_chunks(pdf_path), repeat)
+
+    table_df, timings['concat'] = _timed(
+        lambda: pd.concat([analyzer._normalize_page_tables(tables) for tables in page_tables if tables],
+                          ignore_index=True),
+        repeat)
+    columns, timings['column_inference'] = _timed(lambda: analyzer.infer_columns(table_df, rules), repeat)
+    transactions, timings['amount_cleaning'] = _timed(
+        lambda: analyzer.build_transaction_table(
+            table_df[columns['date']], table_df[columns['description']], table_df[columns['amount']]),
+        repeat)
+
+    spends = transactions[~transactions['is_credit']]
+    # A fresh normalizer per run, so every repeat measures a cold cache
+    merchants, timings['merchant_normalization'] = _timed(
+        lambda: analyzer.MerchantNormalizer().normalize_series(spends['description']), repeat)
+    _, timings['categorization'] = _timed(
+        lambda: rules.totals(spends['description'], spends['amount_paise'], merchants), repeat)
+    _, timings['top_n'] = _timed(lambda: analyzer.select_top_spends(transactions, 15), repeat)
+
+    return {
+        'pages': pages,
+        'rows_per_page': rows_per_page,
+        'transactions': len(transactions),
+        'stages': {
+            stage: {'median_s': statistics.median(runs), 'min_s': min(runs), 'runs': len(runs)}
+            for stage, runs in timings.items()
+        },
+    }
+
+
+def compare_to_baseline(results, baseline, tolerance, min_delta_s=0.005):
+    """
+    Lists the stages that got slower than the baseline by more than the tolerance.
+
+    Stages are compared on their fastest run, which is far less noisy than the median, and
+    slowdowns under min_delta_s are ignored: a stage taking a millisecond or two would
+    otherwise "regress" by 25% on scheduler jitter alone.
+
+    Args:
+        results (dict): This run's results.
+        baseline (dict): An earlier run's results, as written by this script.
+        tolerance (float): Allowed slowdown, e.g. 0.25 for 25%.
+        min_delta_s (float, optional): Smallest absolute slowdown, in seconds, that counts.
+
+    Returns:
+        list: Human-readable descriptions of each regression (empty if there are none).
+    """
+    baseline_runs = {(run['pages'], run['rows_per_page']): run for run in baseline['runs']}
+    regressions = []
+    for run in results['runs']:
+        previous = baseline_runs.get((run['pages'], run['rows_per_page']))
+        if previous is None:
+            continue
+        for stage, timing in run['stages'].items():
+            before = previous['stages'].get(stage, {}).get('min_s')
+            after = timing['min_s']
+            if before and after > before * (1 + tolerance) and after - before >= min_delta_s:
+                regressions.append(
+                    f"{stage} ({run['pages']} pages x {run['rows_per_page']} rows): "
+                    f"{before * 1000:.2f} ms -> {after * 1000:.2f} ms (fastest run)")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the statement analysis pipeline on synthetic PDFs.")
+    parser.add_argument('--pages', type=int, nargs='+', default=[1, 5, 20],
+                        help="Statement sizes to benchmark, in pages (default: 1 5 20)")
+    parser.add_argument('--rows-per-page', type=int, default=30, help="Transactions per page (default: 30)")
+    parser.add_argument('--merchant-mix', default=None,
+                        help="JSON file with a {description: weight} merchant mix")
+    parser.add_argument('--repeat', type=int, default=5, help="Timed runs per stage (default: 5)")
+    parser.add_argument('--skip-extraction', action='store_true',
+                        help="Don't time Camelot; feed the generated cells straight into the later stages "
+                             "(text-layer extraction is still timed)")
+    parser.add_argument('--output', default='bench_output.json', help="Where to write the results")
+    parser.add_argument('--baseline', default=None, help="Earlier results to check for regressions")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="Allowed slowdown per stage against the baseline (default: 0.25)")
+    parser.add_argument('--min-delta-ms', type=float, default=5.0,
+                        help="Ignore slowdowns smaller than this many milliseconds (default: 5)")
+    args = parser.parse_args()
+
+    merchant_mix = None
+    if args.merchant_mix:
+        with open(args.merchant_mix) as f:
+            merchant_mix = json.load(f)
+
+    results = {
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'runs': [],
+    }
+    for pages in args.pages:
+        run = benchmark_statement(pages, args.rows_per_page, merchant_mix, args.repeat, args.skip_extraction)
+        results['runs'].append(run)
+        print(f"{pages} pages ({run['transactions']} transactions):")
+        for stage in STAGES:
+            if stage in run['stages']:
+                print(f"  {stage:<24} {run['stages'][stage]['median_s'] * 1000:10.2f} ms")
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_to_baseline(results, json.load(f), args.tolerance, args.min_delta_ms / 1000)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        if regressions:
+            sys.exit(1)
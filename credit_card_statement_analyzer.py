@@ -1,46 +1,1152 @@
-import camelot # or tabula-py, or pdfplumber
 import pandas as pd
 import os
 import re
-import matplotlib.pyplot as plt
+import sys
 import calendar # To convert month number to month name for plotting
-# If statements are password protected, you might also need pypdf (formerly PyPDF2)
-import plotly.graph_objects as go
+import hashlib
+import json
+import shutil
+import argparse
+import csv
+import sqlite3
+import time
+import tracemalloc
+from contextlib import contextmanager, redirect_stdout
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from collections import OrderedDict
+from functools import partial
+# camelot (or tabula-py, or pdfplumber) and plotly are slow to import, so they are only
+# imported where a PDF actually has to be parsed or a chart has to be drawn.
+# If statements are password protected, camelot uses pypdf (formerly PyPDF2) to open them.
 
-def analyze_credit_card_statement(pdf_path, password=None):
+# --- Pipeline instrumentation ---
+# Opt-in per-stage metrics. Each stage of the analysis (extraction, assembly, column inference,
+# cleaning, categorization) records its wall time, peak Python memory and row/page counts as
+# a flat JSON-serializable event, which is kept on the recorder and passed to an optional hook.
+class StageRecorder:
     """
-    Reads a credit card credit card statement PDF, extracts transactions,
-    and calculates total spends for Swiggy, Zomato, and Blinkit.
+    Records one event per pipeline stage for a single statement.
+    """
+
+    def __init__(self, source=None, hook=None, track_memory=True):
+        """
+        Args:
+            source (str, optional): Tag added to every event, normally the statement filename.
+            hook (callable, optional): Called with each event dict as soon as its stage finishes.
+            track_memory (bool, optional): Measure peak memory with tracemalloc (slows the stages down).
+        """
+        self.source = source
+        self.hook = hook
+        self.track_memory = track_memory
+        self.events = []
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Times the enclosed block as the named stage. The block can add counts (pages, tables,
+        rows kept or dropped, ...) to the yielded dict; they end up in the stage's event.
+        An exception raised in the block is recorded on the event and then re-raised.
+        """
+        metrics = {}
+        # Tracing is only switched on for the outermost stage that needs it, and off again
+        # afterwards, so the rest of the program doesn't pay for it
+        started_tracing = self.track_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        if self.track_memory:
+            tracemalloc.reset_peak()
+            memory_at_start = tracemalloc.get_traced_memory()[0]
+        event = {'event': 'stage', 'source': self.source, 'stage': name, 'status': 'ok'}
+        start = time.perf_counter()
+        try:
+            yield metrics
+        except Exception as e:
+            event['status'] = 'error'
+            event['error'] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            event['wall_s'] = round(time.perf_counter() - start, 6)
+            if self.track_memory:
+                event['peak_memory_bytes'] = max(0, tracemalloc.get_traced_memory()[1] - memory_at_start)
+            if started_tracing:
+                tracemalloc.stop()
+            event.update(metrics)
+            self.events.append(event)
+            if self.hook is not None:
+                self.hook(event)
+
+
+class _NullRecorder:
+    """
+    Stands in for a StageRecorder when instrumentation is off, so the pipeline code
+    doesn't need to check whether it is being recorded.
+    """
+
+    @contextmanager
+    def stage(self, name):
+        yield {}
+
+
+NULL_RECORDER = _NullRecorder()
+
+
+def json_lines_hook(stream):
+    """
+    Returns a StageRecorder hook that writes every event to a stream as one line of JSON.
+    """
+    def hook(event):
+        stream.write(json.dumps(event) + '\n')
+        stream.flush()
+    return hook
+
+
+def summarize_stage_events(events):
+    """
+    Adds up stage events per statement and stage.
+
+    Args:
+        events (list): Events as recorded by StageRecorder.
+
+    Returns:
+        dict: {source: {stage: metrics}} where wall time and counts are summed, peak memory
+              is the maximum, and 'errors' counts the failed runs of the stage.
+    """
+    summary = {}
+    for event in events:
+        totals = summary.setdefault(event.get('source'), {}).setdefault(event['stage'], {'errors': 0})
+        for key, value in event.items():
+            if key in ('event', 'source', 'stage', 'status', 'error'):
+                continue
+            if key == 'peak_memory_bytes':
+                totals[key] = max(totals.get(key, 0), value)
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                totals[key] = totals.get(key, 0) + value
+        if event['status'] == 'error':
+            totals['errors'] += 1
+    return summary
+
+
+# --- Table extraction cache ---
+# Camelot's lattice detection is by far the slowest part of the analysis, so the raw
+# tables it returns are cached on disk. Entries are keyed by the PDF's content hash plus
+# the extraction parameters, which means renaming or moving a statement still hits the
+# cache while any change to its bytes (or to the pages/flavor asked for) misses it.
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'credit_card_statement_analyzer', 'tables')
+MAX_CACHE_BYTES = 256 * 1024 * 1024 # Oldest entries are evicted once the cache grows beyond this
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """
+    Computes the SHA-256 hex digest of a file's contents.
+
+    Args:
+        path (str): The path to the file.
+        chunk_size (int, optional): Number of bytes read per iteration.
+
+    Returns:
+        str: The hex digest of the file contents.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _table_cache_key(content_hash, pages, flavor, password):
+    # The password itself is never written anywhere, only whether one was used
+    protection = 'protected' if password else 'open'
+    raw_key = f"{content_hash}|pages={pages}|flavor={flavor}|{protection}"
+    return hashlib.sha256(raw_key.encode('utf-8')).hexdigest()
+
+
+def _entry_size(entry_dir):
+    return sum(entry.stat().st_size for entry in os.scandir(entry_dir) if entry.is_file())
+
+
+def _evict_cache_entries(cache_dir, max_bytes):
+    """
+    Removes the least recently used cache entries until the cache fits in max_bytes.
+    Each entry's manifest mtime is refreshed on every hit, so it doubles as the LRU clock.
+    """
+    entries = []
+    for entry in os.scandir(cache_dir):
+        # Entries still being written by another process live in '.tmp-' directories
+        if not entry.is_dir() or entry.name.startswith('.tmp-'):
+            continue
+        try:
+            manifest_mtime = os.path.getmtime(os.path.join(entry.path, 'manifest.json'))
+            entries.append((manifest_mtime, _entry_size(entry.path), entry.path))
+        except FileNotFoundError:
+            # Evicted by a concurrent run in the meantime
+            continue
+
+    total_bytes = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total_bytes <= max_bytes:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        total_bytes -= size
+
+
+def _read_cached_tables(entry_dir):
+    manifest_path = os.path.join(entry_dir, 'manifest.json')
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+
+        table_dfs = []
+        for i in range(manifest['tables']):
+            table_df = pd.read_parquet(os.path.join(entry_dir, f"table_{i}.parquet"))
+            # Parquet needs string column names; Camelot hands out positional integers
+            table_df.columns = range(len(table_df.columns))
+            table_dfs.append(table_df)
+
+        os.utime(manifest_path) # Mark the entry as recently used
+    except (FileNotFoundError, ImportError):
+        # Not cached yet (or evicted while reading), or no parquet engine installed
+        return None
+    except Exception as e:
+        # A truncated or corrupt entry (e.g. the disk filled up mid-write): drop it so the
+        # statement is parsed and cached afresh instead of failing on every run
+        print(f"Discarding unreadable table cache entry {entry_dir}: {type(e).__name__}: {e}")
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        return None
+    return table_dfs
+
+
+def _write_cached_tables(entry_dir, table_dfs):
+    # Write into a private directory first and rename it into place, so other processes
+    # (see analyze_statements_folder) never see or evict a half-written entry
+    cache_dir, key = os.path.split(entry_dir)
+    tmp_dir = os.path.join(cache_dir, f".tmp-{key}-{os.getpid()}")
+    os.makedirs(tmp_dir, exist_ok=True)
+    try:
+        for i, table_df in enumerate(table_dfs):
+            to_store = table_df.copy()
+            to_store.columns = [str(col) for col in to_store.columns]
+            to_store.to_parquet(os.path.join(tmp_dir, f"table_{i}.parquet"), index=False)
+        with open(os.path.join(tmp_dir, 'manifest.json'), 'w') as f:
+            json.dump({'tables': len(table_dfs)}, f)
+        os.rename(tmp_dir, entry_dir)
+    except ImportError as e:
+        # No parquet engine (pyarrow / fastparquet) installed, so just skip caching
+        print(f"Table cache disabled: {e}")
+    except OSError:
+        # Another process cached the same statement first
+        pass
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def extract_tables(pdf_path, password=None, pages='1-2', flavor='lattice',
+                   cache_dir=CACHE_DIR, max_cache_bytes=MAX_CACHE_BYTES, content_hash=None):
+    """
+    Extracts the raw tables from a PDF statement with Camelot, going through the
+    on-disk cache so that a statement is only ever parsed once.
 
     Args:
         pdf_path (str): The path to the PDF credit card statement.
         password (str, optional): The password for the PDF, if it's protected.
+        pages (str, optional): The pages to extract tables from, in Camelot's format.
+        flavor (str, optional): The Camelot parsing mode ('lattice' or 'stream').
+        cache_dir (str, optional): Where to keep cached tables. Pass None to disable caching.
+        max_cache_bytes (int, optional): Size above which the oldest entries are evicted.
+        content_hash (str, optional): The PDF's SHA-256, if the caller already computed it.
 
     Returns:
-        dict: A dictionary with the total spends for Swiggy, Zomato, and Blinkit.
-              Returns None if parsing fails.
+        list: One DataFrame of raw cell strings per table found in the PDF.
+    """
+    import camelot
+
+    if cache_dir is None:
+        tables = camelot.read_pdf(pdf_path, pages=pages, flavor=flavor, password=password)
+        return [table.df for table in tables]
+
+    key = _table_cache_key(content_hash or file_sha256(pdf_path), pages, flavor, password)
+    entry_dir = os.path.join(cache_dir, key)
+    cached = _read_cached_tables(entry_dir)
+    if cached is not None:
+        return cached
+
+    tables = camelot.read_pdf(pdf_path, pages=pages, flavor=flavor, password=password)
+    table_dfs = [table.df for table in tables]
+    _write_cached_tables(entry_dir, table_dfs)
+    _evict_cache_entries(cache_dir, max_cache_bytes)
+    return table_dfs
+
+
+# --- Page-by-page extraction ---
+# Transaction dates look like dd/mm/yyyy or dd-mm-yyyy
+DATE_PATTERN = re.compile(r'\d{2}[-/]\d{2}[-/]\d{4}')
+# Words found in transaction table headers; used by page pre-screening and layout fingerprints
+HEADER_KEYWORDS = {'date', 'description', 'details', 'particulars', 'transaction', 'amount', 'debit', 'credit', 'inr'}
+
+
+def _open_pdf(pdf_path, password=None):
+    from pypdf import PdfReader # pypdf is installed alongside camelot
+
+    reader = PdfReader(pdf_path)
+    if reader.is_encrypted:
+        reader.decrypt(password or '')
+    return reader
+
+
+def count_pdf_pages(pdf_path, password=None):
+    """
+    Returns the number of pages in a PDF without rendering any of them.
+    """
+    return len(_open_pdf(pdf_path, password).pages)
+
+
+def _normalize_page_tables(table_dfs):
+    """
+    Stacks the tables found on one page and tidies the raw cells: whitespace is stripped
+    and rows with no content at all (spacer rows, empty grid cells) are dropped.
+    """
+    page_df = pd.concat(table_dfs, ignore_index=True) if len(table_dfs) > 1 else table_dfs[0]
+    page_df = page_df.fillna('').astype(str).apply(lambda col: col.str.strip())
+    return page_df[page_df.ne('').any(axis=1)]
+
+
+def iter_transaction_chunks(pdf_path, password=None, pages='all', flavor='lattice', stop_at_section_end=True,
+                            metrics=None):
+    """
+    Extracts a statement one page at a time, yielding the normalized table rows of
+    each page as soon as that page has been parsed.
+
+    Args:
+        pdf_path (str): The path to the PDF credit card statement.
+        password (str, optional): The password for the PDF, if it's protected.
+        pages (str or list, optional): 'all', or the page numbers to extract (1-based).
+        flavor (str, optional): The Camelot parsing mode ('lattice' or 'stream').
+        stop_at_section_end (bool, optional): Stop at the first page without any transaction
+            dates once transactions have been seen, so trailing terms-and-conditions and
+            rewards pages are never parsed.
+        metrics (dict, optional): If given, 'pages' (pages parsed) and 'tables' (tables found)
+            are counted into it.
+
+    Yields:
+        tuple: (page_number, DataFrame of that page's table rows). Pages without tables are skipped.
+    """
+    if pages == 'all':
+        pages = range(1, count_pdf_pages(pdf_path, password) + 1)
+    content_hash = file_sha256(pdf_path) # Hash once rather than for every page's cache lookup
+
+    metrics = {} if metrics is None else metrics
+    metrics.setdefault('pages', 0)
+    metrics.setdefault('tables', 0)
+    seen_transactions = False
+    for page_number in pages:
+        table_dfs = extract_tables(pdf_path, password=password, pages=str(page_number), flavor=flavor,
+                                   content_hash=content_hash)
+        metrics['pages'] += 1
+        metrics['tables'] += len(table_dfs)
+        page_df = _normalize_page_tables(table_dfs) if table_dfs else None
+        has_dates = page_df is not None and page_df.apply(lambda col: col.str.contains(DATE_PATTERN)).any(axis=None)
+
+        if has_dates:
+            seen_transactions = True
+        elif seen_transactions and stop_at_section_end:
+            break
+
+        if page_df is not None and not page_df.empty:
+            yield page_number, page_df
+
+
+# --- Page pre-screening ---
+# Before Camelot renders anything, every page's text layer is scored for signs of a
+# transaction table, and table detection only runs on the pages that qualify. Cover,
+# summary, rewards and terms-and-conditions pages cost one text extraction each.
+AMOUNT_TOKEN_PATTERN = re.compile(r'(?<![\d.])\d[\d,]*\.\d{2}(?!\d)')
+
+
+def score_page_text(text, min_lines=1):
+    """
+    Scores one page's text for signs of a transaction table. What gives a transaction away
+    is a date and an amount on the same line, so a continuation page with a couple of rows
+    qualifies while a cover page with a statement date at the top and a total due further
+    down doesn't.
+
+    Args:
+        text (str): The page's text layer.
+        min_lines (int, optional): Lines holding both a date and an amount needed to qualify.
+
+    Returns:
+        dict: The 'dates' and 'amounts' found, the 'dated_amount_lines' holding both, and
+              whether the page 'qualifies'.
+    """
+    dates = amounts = dated_amount_lines = 0
+    for line in text.splitlines():
+        line_dates = len(DATE_PATTERN.findall(line))
+        line_amounts = len(AMOUNT_TOKEN_PATTERN.findall(line))
+        dates += line_dates
+        amounts += line_amounts
+        if line_dates and line_amounts:
+            dated_amount_lines += 1
+    return {'dates': dates, 'amounts': amounts, 'dated_amount_lines': dated_amount_lines,
+            'qualifies': dated_amount_lines >= min_lines}
+
+
+def screen_transaction_pages(pdf_path, password=None, min_lines=1):
+    """
+    Returns the pages of a statement that look like they hold transactions.
+
+    Args:
+        pdf_path (str): The path to the PDF credit card statement.
+        password (str, optional): The password for the PDF, if it's protected.
+        min_lines (int, optional): See score_page_text.
+
+    Returns:
+        list: The qualifying page numbers (1-based), or None if there is nothing to go by, in
+              which case every page has to be examined. That is the case when the PDF has no
+              text layer (e.g. scanned statements) or when no page qualifies, e.g. because the
+              text layer puts every table cell on a line of its own.
+    """
+    reader = _open_pdf(pdf_path, password)
+    qualifying = []
+    for page_number, page in enumerate(reader.pages, start=1):
+        if score_page_text(page.extract_text() or '', min_lines)['qualifies']:
+            qualifying.append(page_number)
+    return qualifying or None
+
+
+# --- Extraction backends ---
+# An extractor turns a statement PDF into page chunks of raw table rows (positional columns,
+# cell strings), which is all the rest of the pipeline relies on. Extractors are tried in
+# order and the first one whose result passes its own validation is used, so the cheap
+# text-layer parser handles statements with a clean embedded text layer and Camelot's
+# lattice detection only runs for the ones it can't.
+TRANSACTION_LINE_PATTERN = re.compile(
+    r'^(?P<date>\d{2}[-/]\d{2}[-/]\d{4})\s+(?P<description>.+?)\s+'
+    r'(?P<amount>-?(?:₹|Rs\.?|INR)?\s?\d[\d,]*\.\d{2}(?:\s?(?:Cr|CR|Dr|DR))?)$'
+)
+
+
+class CamelotExtractor:
+    """
+    Extracts ruled tables with Camelot, page by page and through the table cache.
+    """
+    name = 'camelot'
+
+    def __init__(self, flavor='lattice', prescreen=True):
+        """
+        Args:
+            flavor (str, optional): The Camelot parsing mode ('lattice' or 'stream').
+            prescreen (bool, optional): When extracting all pages, only run table detection on
+                the pages screen_transaction_pages picks out.
+        """
+        self.flavor = flavor
+        self.prescreen = prescreen
+
+    def extract_chunks(self, pdf_path, password=None, pages='all', stop_at_section_end=True, metrics=None):
+        """
+        Returns the statement's page chunks (see iter_transaction_chunks). Always succeeds
+        when Camelot does, so it is the fallback of last resort.
+        """
+        if pages == 'all' and self.prescreen:
+            screened = screen_transaction_pages(pdf_path, password)
+            if screened is not None:
+                pages = screened
+                if metrics is not None:
+                    metrics['pages_screened_in'] = len(screened)
+        return [page_df for _, page_df in
+                iter_transaction_chunks(pdf_path, password, pages, self.flavor, stop_at_section_end, metrics)]
+
+
+def _names_debit_and_credit_columns(line):
+    # A table header like "Date  Details  Debit  Credit  Balance", not a sentence that
+    # happens to mention a credit card
+    tokens = set(re.findall(r'[a-z]+', line.lower()))
+    return {'debit', 'credit'} <= tokens and len(HEADER_KEYWORDS & tokens) >= 3
+
+
+class TextLayerExtractor:
+    """
+    Parses transaction lines ("date description amount") straight from the PDF's embedded
+    text layer, without rendering the pages. Statements without a usable text layer, or
+    whose dated lines mostly don't fit the pattern, fail validation.
+
+    Only a single amount per line can be told apart. A line whose description still holds an
+    amount (e.g. the debit in front of a running-balance column) doesn't count as parsed, and
+    statements whose header names separate debit and credit columns are refused outright,
+    since the sign of each amount would be lost. Both go to the next extractor instead.
+    """
+    name = 'text-layer'
+
+    def __init__(self, min_match_ratio=0.9):
+        """
+        Args:
+            min_match_ratio (float, optional): Share of the lines starting with a date that must
+                parse as transactions for the result to be trusted.
+        """
+        self.min_match_ratio = min_match_ratio
+
+    def extract_chunks(self, pdf_path, password=None, pages='all', stop_at_section_end=True, metrics=None):
+        """
+        Returns the statement's page chunks with columns 0 (date), 1 (description) and
+        2 (amount), or None if the text layer doesn't validate.
+        """
+        reader = _open_pdf(pdf_path, password)
+        if pages == 'all':
+            pages = range(1, len(reader.pages) + 1)
+        metrics = {} if metrics is None else metrics
+
+        chunks = []
+        dated_lines = 0
+        seen_transactions = False
+        for page_number in pages:
+            rows = []
+            for line in (reader.pages[page_number - 1].extract_text() or '').splitlines():
+                line = line.strip()
+                if not DATE_PATTERN.match(line):
+                    if _names_debit_and_credit_columns(line):
+                        metrics['debit_credit_columns'] = page_number
+                        return None
+                    continue
+                dated_lines += 1
+                match = TRANSACTION_LINE_PATTERN.match(line)
+                if match and not AMOUNT_TOKEN_PATTERN.search(match.group('description')):
+                    rows.append([match.group('date'), match.group('description'), match.group('amount')])
+            metrics['pages'] = metrics.get('pages', 0) + 1
+
+            if rows:
+                seen_transactions = True
+                chunks.append(pd.DataFrame(rows))
+            elif seen_transactions and stop_at_section_end:
+                break
+
+        parsed_lines = sum(len(chunk) for chunk in chunks)
+        if not parsed_lines or parsed_lines < self.min_match_ratio * dated_lines:
+            return None
+        return chunks
+
+
+def default_extractors(flavor='lattice'):
+    """
+    Returns the default extractor chain: the text layer first, Camelot as the fallback.
+    """
+    return [TextLayerExtractor(), CamelotExtractor(flavor)]
+
+
+def assemble_transactions(pdf_path, password=None, pages='all', flavor='lattice', stop_at_section_end=True,
+                          recorder=NULL_RECORDER, extractors=None):
+    """
+    Builds the statement's full table of raw transaction rows from the page-by-page chunks.
+    The chunks are collected first and concatenated once, so assembly stays linear in the
+    number of tables rather than re-copying everything accumulated so far for each one.
+
+    Args:
+        pdf_path (str): The path to the PDF credit card statement.
+        password (str, optional): The password for the PDF, if it's protected.
+        pages (str or list, optional): 'all', or the page numbers to extract (1-based).
+        flavor (str, optional): The Camelot parsing mode ('lattice' or 'stream').
+        stop_at_section_end (bool, optional): See iter_transaction_chunks.
+        recorder (StageRecorder, optional): Records the 'extraction' and 'assembly' stages.
+        extractors (list, optional): Extractors to try in order. Defaults to default_extractors(flavor).
+
+    Returns:
+        pd.DataFrame: All table rows of the statement (empty if no tables were found).
+    """
+    if extractors is None:
+        extractors = default_extractors(flavor)
+
+    chunks = []
+    with recorder.stage('extraction') as metrics:
+        for i, extractor in enumerate(extractors):
+            # Each attempt counts into its own dict, so only the backend that produced the
+            # chunks shows up in the stage's page and table counts
+            attempt_metrics = {}
+            try:
+                extracted = extractor.extract_chunks(pdf_path, password, pages, stop_at_section_end, attempt_metrics)
+            except Exception as e:
+                if i == len(extractors) - 1:
+                    raise
+                # E.g. pypdf choking on an unusual font; the next backend may still cope
+                print(f"The {extractor.name} extractor failed on {os.path.basename(pdf_path)} "
+                      f"({type(e).__name__}: {e}), falling back")
+                continue
+            if extracted is not None:
+                metrics.update(attempt_metrics)
+                metrics['backend'] = extractor.name
+                chunks = extracted
+                break
+    with recorder.stage('assembly') as metrics:
+        transactions_df = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
+        metrics['rows'] = len(transactions_df)
+    return transactions_df
+
+
+# --- Statement table schema inference ---
+# Inferring which columns hold the date, description and amount is done on a bounded,
+# evenly spread sample of rows. The resulting column mapping is remembered per table
+# layout (column count, header tokens, issuer), so statements from a known issuer
+# skip inference completely on later runs.
+LAYOUT_REGISTRY_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'credit_card_statement_analyzer', 'layouts.json')
+SCHEMA_SAMPLE_ROWS = 200
+ISSUER_PATTERN = re.compile(r'[A-Za-z]{3}_\d{4}_(.+)\.pdf$')
+
+
+def issuer_from_filename(pdf_path):
+    """
+    Returns the issuer part of a statement filename, e.g. "StandardChartered" for
+    "Jan_2025_StandardChartered.pdf", or None if the filename doesn't follow that pattern.
+    """
+    match = ISSUER_PATTERN.match(os.path.basename(pdf_path))
+    return match.group(1) if match else None
+
+
+def layout_fingerprint(transactions_df, issuer=None, header_search_rows=5):
+    """
+    Fingerprints the layout of an extracted statement table from its column count,
+    the tokens of its header row (the first of the top rows mentioning a header keyword)
+    and the issuer.
+
+    Args:
+        transactions_df (pd.DataFrame): The raw extracted table rows.
+        issuer (str, optional): The card issuer, e.g. from issuer_from_filename.
+        header_search_rows (int, optional): How many top rows to search for the header.
+
+    Returns:
+        str: A short hex fingerprint.
+    """
+    header_tokens = []
+    for row in transactions_df.head(header_search_rows).itertuples(index=False):
+        tokens = re.findall(r'[a-z]+', ' '.join(str(cell) for cell in row).lower())
+        if HEADER_KEYWORDS.intersection(tokens):
+            header_tokens = tokens
+            break
+    raw = json.dumps([len(transactions_df.columns), header_tokens, issuer])
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:16]
+
+
+def infer_columns(transactions_df, rules, sample_rows=SCHEMA_SAMPLE_ROWS):
+    """
+    Infers the date, description and amount columns from a bounded sample of rows.
+    Every check is a vectorized string operation over the sample, not a per-cell lambda.
+
+    Args:
+        transactions_df (pd.DataFrame): The raw extracted table rows.
+        rules (CategoryRules): Used to recognise the description column by its merchants.
+        sample_rows (int, optional): Maximum number of rows looked at.
+
+    Returns:
+        dict: {'date': col, 'description': col, 'amount': col}; a value is None where
+              no column fits and the usual default position doesn't exist either.
+    """
+    columns = list(transactions_df.columns)
+    step = max(1, len(transactions_df) // sample_rows)
+    sample = transactions_df.iloc[::step].head(sample_rows).fillna('').astype(str).apply(lambda col: col.str.strip())
+
+    # Defaults from the statement layout this script was first written against
+    date_col = columns[0]
+    description_col = columns[1] if len(columns) > 1 else None
+    amount_col = columns[6] if len(columns) > 6 else None
+
+    # Date column: the first one where most cells look like dd/mm/yyyy or dd-mm-yyyy
+    date_share = sample.apply(lambda col: col.str.match(DATE_PATTERN)).mean()
+    date_like = date_share[date_share > 0.5]
+    if not date_like.empty:
+        date_col = date_like.index[0]
+
+    # Amount column: the last one where most cells parse as amounts (see AMOUNT_PATTERN)
+    amount_share = sample.apply(lambda col: col.str.match(AMOUNT_PATTERN)).mean()
+    amount_like = amount_share[amount_share > 0.7]
+    if not amount_like.empty:
+        amount_col = amount_like.index[-1]
+
+    # Description column: the last one mentioning a known merchant, else the one with the longest text
+    merchant_hits = [col for col in columns if rules.categorize(sample[col]).notna().any()]
+    if merchant_hits:
+        description_col = merchant_hits[-1]
+    else:
+        text_columns = [col for col in columns if col not in (date_col, amount_col)]
+        if text_columns:
+            description_col = sample[text_columns].apply(lambda col: col.str.len()).mean().idxmax()
+
+    return {'date': date_col, 'description': description_col, 'amount': amount_col}
+
+
+def _load_layout_registry(registry_path):
+    try:
+        with open(registry_path) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _save_layout_registry(registry, registry_path):
+    os.makedirs(os.path.dirname(registry_path), exist_ok=True)
+    tmp_path = f"{registry_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(registry, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, registry_path) # Atomic, so concurrent workers never see a partial file
+
+
+def reset_layout_registry(registry_path=LAYOUT_REGISTRY_PATH):
+    """
+    Forgets every remembered column mapping, e.g. after a wrong inference was saved for a layout.
+    """
+    try:
+        os.remove(registry_path)
+    except FileNotFoundError:
+        pass
+
+
+def resolve_columns(transactions_df, rules, issuer=None, registry_path=LAYOUT_REGISTRY_PATH):
+    """
+    Returns the date/description/amount column mapping for an extracted statement table,
+    from the layout registry when this layout has been seen before and by inference
+    (remembered for next time) otherwise.
+
+    Args:
+        transactions_df (pd.DataFrame): The raw extracted table rows.
+        rules (CategoryRules): The categorization rules, used by infer_columns.
+        issuer (str, optional): The card issuer, part of the layout fingerprint.
+        registry_path (str, optional): The layout registry file. Pass None to always infer.
+
+    Returns:
+        dict: {'date': col, 'description': col, 'amount': col}
+    """
+    if registry_path is None:
+        return infer_columns(transactions_df, rules)
+
+    fingerprint = layout_fingerprint(transactions_df, issuer)
+    registry = _load_layout_registry(registry_path)
+    mapping = registry.get(fingerprint)
+    if mapping and all(col in transactions_df.columns for col in mapping.values()):
+        return mapping
+
+    mapping = infer_columns(transactions_df, rules)
+    if all(col is not None for col in mapping.values()):
+        # Column labels are Camelot's positional integers, which survive the JSON round trip
+        registry[fingerprint] = {role: int(col) for role, col in mapping.items()}
+        _save_layout_registry(registry, registry_path)
+    return mapping
+
+
+# --- Merchant categorization rules ---
+# Each rule maps a merchant keyword (or a regex) to a category. When a description matches
+# several rules the one with the lowest priority number wins, ties going to the earlier rule.
+DEFAULT_CATEGORY_RULES = [
+    # (pattern, category, priority, is_regex)
+    ("SWIGGY", "Swiggy", 1, False),
+    ("ZOMATO", "Zomato", 2, False),
+    ("BLINKIT", "Blinkit", 3, False),
+]
+
+
+class CategoryRules:
+    """
+    A compiled set of categorization rules. The plain keyword rules are folded into one
+    alternation without capture groups, matched against the upper-cased description (a
+    case-sensitive literal alternation is far cheaper for re than an IGNORECASE one), so a
+    description is scanned once however many merchants are tracked, and each match is
+    mapped back to its rule with a dict lookup. The search restarts one character after each match rather than at its
+    end, so a lower-priority keyword can't hide an overlapping higher-priority one. Regex
+    rules are checked on their own, and only when they could outrank the best keyword.
+    """
+
+    def __init__(self, rules):
+        """
+        Args:
+            rules (list): (pattern, category, priority, is_regex) tuples. Plain patterns are
+                          matched as case-insensitive substrings.
+        """
+        ranked = sorted(enumerate(rules), key=lambda item: (int(item[1][2]), item[0]))
+        self.keyword_rules = {} # {upper-cased keyword: (rank, category)}, best rank per keyword
+        self.regex_rules = [] # [(rank, compiled pattern, category)] in rank order
+        for rank, (_, (pattern, category, _priority, is_regex)) in enumerate(ranked):
+            if is_regex:
+                self.regex_rules.append((rank, re.compile(pattern, re.IGNORECASE), category))
+            else:
+                self.keyword_rules.setdefault(pattern.upper(), (rank, category))
+        # In rank order, so where several keywords start at the same position the best one matches
+        keywords = sorted(self.keyword_rules, key=lambda keyword: self.keyword_rules[keyword][0])
+        self.pattern = re.compile('|'.join(re.escape(keyword) for keyword in keywords) or r'(?!)')
+        # Identifies the rule set, so stored categorizations can tell when they went stale
+        self.signature = hashlib.sha256(repr([tuple(rule) for rule in rules]).encode('utf-8')).hexdigest()[:16]
+        # Every category gets a total, in the order the rules introduced them
+        self.categories = list(dict.fromkeys(rule[1] for rule in rules))
+
+    def category_of(self, description):
+        """
+        Returns the category of the highest-priority rule matching the description, or None.
+        """
+        best = None # (rank, category)
+        text = description.upper()
+        match = self.pattern.search(text)
+        while match:
+            rule = self.keyword_rules[match.group(0)]
+            if best is None or rule[0] < best[0]:
+                best = rule
+                if best[0] == 0:
+                    return best[1] # Nothing outranks the first rule
+            match = self.pattern.search(text, match.start() + 1)
+        for rank, regex, category in self.regex_rules:
+            if best is not None and rank > best[0]:
+                break
+            if regex.search(description):
+                return category
+        return best[1] if best else None
+
+    def categorize(self, descriptions, merchants=None):
+        """
+        Categorizes a column of transaction descriptions.
+
+        Args:
+            descriptions (pd.Series): The transaction descriptions.
+            merchants (pd.Series, optional): Their normalized merchant names (see
+                MerchantNormalizer), matched only where the raw description matches no rule.
+
+        Returns:
+            pd.Series: The category of each description (NaN where no rule matched),
+                       aligned with the input.
+        """
+        categories = self._categorize(descriptions)
+        if merchants is not None:
+            categories = categories.fillna(self._categorize(merchants))
+        return categories
+
+    def _categorize(self, descriptions):
+        # Statements repeat the same merchants over and over, so only the distinct
+        # descriptions go through the regex and the result is broadcast back
+        if isinstance(descriptions.dtype, pd.CategoricalDtype):
+            codes, uniques = descriptions.cat.codes.to_numpy(), descriptions.cat.categories.astype(str)
+        else:
+            codes, uniques = pd.factorize(descriptions.astype(str))
+        unique_categories = pd.Series([self.category_of(d) for d in uniques], dtype=object)
+        categories = unique_categories.reindex(codes).to_numpy() # code -1 (missing) maps to NaN
+        return pd.Series(categories, index=descriptions.index, dtype=object)
+
+    def totals(self, descriptions, amounts_paise, merchants=None):
+        """
+        Sums amounts per category.
+
+        Args:
+            descriptions (pd.Series): The transaction descriptions.
+            amounts_paise (pd.Series): The integer amounts in paise, aligned with descriptions.
+            merchants (pd.Series, optional): Normalized merchant names, as for categorize.
+
+        Returns:
+            dict: {category: total in rupees} for every category in the rules. The sums are
+                  exact, since they are taken over integer paise.
+        """
+        sums = amounts_paise.groupby(self.categorize(descriptions, merchants), observed=True).sum()
+        return {category: int(sums.get(category, 0)) / 100 for category in self.categories}
+
+
+def load_category_rules(rules_path):
+    """
+    Loads categorization rules from a CSV file with the columns
+    pattern,category,priority and an optional regex column (true/false).
+
+    Example:
+        pattern,category,priority,regex
+        SWIGGY,Swiggy,1,false
+        ZOMATO,Zomato,2,false
+        ^AMZN|AMAZON,Shopping,5,true
+
+    Args:
+        rules_path (str): The path to the CSV rule table.
+
+    Returns:
+        CategoryRules: The compiled rules.
+    """
+    rules = []
+    with open(rules_path, newline='') as f:
+        for row in csv.DictReader(f):
+            is_regex = str(row.get('regex') or '').strip().lower() in ('1', 'true', 'yes')
+            priority = row.get('priority') or 100
+            rules.append((row['pattern'].strip(), row['category'].strip(), int(priority), is_regex))
+    return CategoryRules(rules)
+
+
+# --- Merchant normalization ---
+# The same merchant shows up under many spellings: behind a payment gateway prefix
+# ("PAYU*SWIGGY"), with the city and country appended ("BLINKIT GURGAON IN"), or with a
+# per-transaction reference number ("NETFLIX.COM 4979315673"). Descriptions are reduced
+# to one canonical merchant name before they're categorized or rolled up, and the
+# results are memoized, since the same few hundred merchants recur every month. The memo
+# is keyed on the description with its case, spacing and long digit runs evened out, so a
+# new reference number on every transaction doesn't make every lookup a miss.
+MERCHANT_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'credit_card_statement_analyzer', 'merchants.json')
+MERCHANT_CACHE_SIZE = 4096
+
+GATEWAY_PREFIX_PATTERN = re.compile(
+    r'^(?:(?:PAYU|PYU|RAZORPAY|RAZ|RZP|PAYTM|CCAVENUE|BILLDESK|CASHFREE|PHONEPE|GPAY|UPI|POS|ECOM)\s*[*\-/:]\s*'
+    r'|(?:POS|ECOM)\s+)')
+# Any token with a run of three or more digits is a reference, terminal or order number
+REFERENCE_PATTERN = re.compile(r'(?:\bREF(?:\s*NO)?\.?\s*)?#?\b(?=[\w-]*\d{3})[\w-]+')
+# Runs of three or more digits are collapsed to "000" in the cache key. That is still a
+# reference number to REFERENCE_PATTERN, so the key normalizes exactly like the raw text.
+DIGIT_RUN_PATTERN = re.compile(r'\d{3,}')
+LOCATION_SUFFIX_PATTERN = re.compile(
+    r'(?:[\s,]+(?:IN|IND|INDIA|NEW DELHI|DELHI|GURGAON|GURUGRAM|NOIDA|MUMBAI|BOMBAY|BANGALORE|BENGALURU|'
+    r'HYDERABAD|CHENNAI|KOLKATA|PUNE|AHMEDABAD|JAIPUR|CHANDIGARH|KOCHI|LUCKNOW|INDORE|GOA))+$')
+
+# (pattern, canonical name) pairs, tried in order against the cleaned description
+DEFAULT_MERCHANT_ALIASES = [
+    (r'^BUNDL TECHNOLOGIES', 'SWIGGY'),
+    (r'^(?:SWIGGY\s*)?INSTAMART', 'SWIGGY INSTAMART'),
+    (r'^SWIGGY', 'SWIGGY'),
+    (r'^ZOMATO', 'ZOMATO'),
+    (r'^(?:BLINKIT|GROFERS)', 'BLINKIT'),
+    (r'^(?:AMAZON|AMZN)\s*PAY', 'AMAZON PAY'),
+    (r'^(?:AMAZON|AMZN)\s*PRIME', 'AMAZON PRIME'),
+    (r'^(?:AMAZON|AMZN)', 'AMAZON'),
+    (r'^UBER\s*EATS', 'UBER EATS'),
+    (r'^UBER', 'UBER'),
+    (r'^NETFLIX', 'NETFLIX'),
+]
+
+
+class MerchantNormalizer:
+    """
+    Maps raw transaction descriptions to canonical merchant names, with an LRU cache of
+    the results that can optionally be persisted between runs.
+    """
+
+    def __init__(self, aliases=None, max_size=MERCHANT_CACHE_SIZE, cache_path=None):
+        """
+        Args:
+            aliases (list, optional): (regex, canonical name) pairs, tried in order on the
+                                      cleaned description. Defaults to DEFAULT_MERCHANT_ALIASES.
+            max_size (int, optional): Maximum number of memoized descriptions; 0 disables the cache.
+            cache_path (str, optional): A JSON file to load the cache from and save it to.
+                                        None keeps the cache in memory only.
+        """
+        if aliases is None:
+            aliases = DEFAULT_MERCHANT_ALIASES
+        self.aliases = [(re.compile(pattern, re.IGNORECASE), name) for pattern, name in aliases]
+        self.max_size = max_size
+        self.cache_path = cache_path
+        # Identifies the normalization, so a persisted cache or stored merchant names can tell
+        # when they went stale
+        self.signature = hashlib.sha256(repr([
+            GATEWAY_PREFIX_PATTERN.pattern, REFERENCE_PATTERN.pattern, DIGIT_RUN_PATTERN.pattern,
+            LOCATION_SUFFIX_PATTERN.pattern,
+            [tuple(alias) for alias in aliases],
+        ]).encode('utf-8')).hexdigest()[:16]
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if cache_path:
+            self._load()
+
+    def _load(self):
+        try:
+            with open(self.cache_path) as f:
+                stored = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        if stored.get('signature') == self.signature and self.max_size > 0:
+            # Stored least recently used first, so the most recent entries survive a smaller max_size
+            for key, merchant in stored.get('merchants', [])[-self.max_size:]:
+                self.cache[key] = merchant
+
+    def save(self):
+        """
+        Writes the cache to cache_path (a no-op for an in-memory normalizer).
+        """
+        if not self.cache_path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.cache_path)), exist_ok=True)
+        tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'signature': self.signature, 'merchants': list(self.cache.items())}, f)
+        os.replace(tmp_path, self.cache_path)
+
+    @staticmethod
+    def cache_key(description):
+        """
+        Returns the cheap pre-normalized form a description is memoized under: upper-cased,
+        with whitespace and runs of three or more digits collapsed.
+        """
+        return DIGIT_RUN_PATTERN.sub('000', ' '.join(str(description).upper().split()))
+
+    def canonical_name(self, description):
+        """
+        Normalizes a single description, bypassing the cache.
+        """
+        # Starting from the cache key keeps the result identical whether or not it's cached
+        text = self.cache_key(description)
+        cleaned = GATEWAY_PREFIX_PATTERN.sub('', text).replace('*', ' ')
+        cleaned = REFERENCE_PATTERN.sub(' ', cleaned)
+        cleaned = LOCATION_SUFFIX_PATTERN.sub('', ' '.join(cleaned.split()))
+        cleaned = cleaned.strip(' ,.-/#') or text
+        for pattern, name in self.aliases:
+            if pattern.search(cleaned):
+                return name
+        return cleaned
+
+    def normalize(self, description):
+        """
+        Returns the canonical merchant name of a description, from the cache when possible.
+        """
+        key = self.cache_key(description)
+        merchant = self.cache.get(key)
+        if merchant is not None:
+            self.hits += 1
+            self.cache.move_to_end(key)
+            return merchant
+        self.misses += 1
+        merchant = self.canonical_name(key)
+        if self.max_size > 0:
+            self.cache[key] = merchant
+            if len(self.cache) > self.max_size:
+                self.cache.popitem(last=False)
+        return merchant
+
+    def normalize_series(self, descriptions):
+        """
+        Normalizes a column of transaction descriptions.
+
+        Args:
+            descriptions (pd.Series): The transaction descriptions.
+
+        Returns:
+            pd.Series: The categorical merchant name of each description (NaN where the
+                       description is missing), aligned with the input.
+        """
+        # Like CategoryRules.categorize, only the distinct descriptions are looked up
+        if isinstance(descriptions.dtype, pd.CategoricalDtype):
+            codes, uniques = descriptions.cat.codes.to_numpy(), descriptions.cat.categories.astype(str)
+        else:
+            codes, uniques = pd.factorize(descriptions.astype(str))
+        merchants = [self.normalize(description) for description in uniques]
+        names = list(dict.fromkeys(merchants))
+        positions = {name: i for i, name in enumerate(names)}
+        merchant_codes = pd.Series([positions[m] for m in merchants], dtype='int64').reindex(codes).fillna(-1)
+        return pd.Series(pd.Categorical.from_codes(merchant_codes.astype('int64').to_numpy(), categories=names),
+                         index=descriptions.index)
+
+
+DEFAULT_MERCHANT_NORMALIZER = MerchantNormalizer() # In-memory; used when no normalizer is passed in
+
+
+# --- Canonical transaction table ---
+# Every extracted statement ends up as one compact, typed table:
+#   date          datetime64
+#   description   category (statements repeat the same merchants, so each string is stored once)
+#   amount_paise  int64 amount in paise, always positive, so totals are exact integer sums
+#   is_credit     bool, True for credits (refunds, payments), False for debits (spends)
+TRANSACTION_COLUMNS = ['date', 'description', 'amount_paise', 'is_credit']
+
+# An optional minus sign, an optional currency symbol, the number and an optional Cr/Dr suffix
+AMOUNT_PATTERN = re.compile(
+    r'^\s*(?P<sign>-)?\s*(?:₹|Rs\.?|INR)?\s*(?P<rupees>\d[\d,]*)(?:\.(?P<paise>\d{1,2}))?\s*(?P<suffix>Cr|Dr)?\.?\s*$',
+    re.IGNORECASE)
+
+
+def parse_amounts(amounts):
+    """
+    Parses amount cells such as "1,234.50", "₹ 99.00", "Rs. 1,200" or "5,000.00 Cr" in one
+    vectorized pass, without going through floating point.
+
+    Args:
+        amounts (pd.Series): The raw amount cells.
+
+    Returns:
+        pd.DataFrame: 'amount_paise' (nullable Int64, missing where a cell isn't an amount,
+                      e.g. header rows) and 'is_credit' (a Cr suffix or a minus sign), aligned
+                      with the input.
+    """
+    parts = amounts.astype(str).str.extract(AMOUNT_PATTERN)
+    rupees = pd.to_numeric(parts['rupees'].str.replace(',', '', regex=False), errors='coerce').astype('Int64')
+    paise = pd.to_numeric(parts['paise'].str.ljust(2, '0'), errors='coerce').fillna(0).astype('Int64')
+    is_credit = parts['suffix'].str.lower().eq('cr') | parts['sign'].eq('-')
+    return pd.DataFrame({
+        'amount_paise': rupees * 100 + paise,
+        'is_credit': is_credit.fillna(False).astype(bool),
+    }, index=amounts.index)
+
+
+def parse_dates(dates):
+    """
+    Parses dd/mm/yyyy or dd-mm-yyyy date cells in one vectorized pass.
+
+    Returns:
+        pd.Series: datetime64 dates, NaT where a cell isn't a date.
+    """
+    normalized = dates.astype(str).str.strip().str.slice(0, 10).str.replace('-', '/', regex=False)
+    return pd.to_datetime(normalized, format='%d/%m/%Y', errors='coerce')
+
+
+def build_transaction_table(dates, descriptions, amounts):
     """
-    all_transactions_df = pd.DataFrame()
+    Builds the canonical transaction table from raw date, description and amount cells.
+    Rows whose amount doesn't parse (headers, subtotal labels, blank rows) are dropped.
 
+    Args:
+        dates (pd.Series): The raw date cells.
+        descriptions (pd.Series): The raw description cells.
+        amounts (pd.Series): The raw amount cells.
+
+    Returns:
+        pd.DataFrame: A table with the TRANSACTION_COLUMNS.
+    """
+    parsed = parse_amounts(amounts)
+    keep = parsed['amount_paise'].notna().to_numpy()
+    return pd.DataFrame({
+        'date': parse_dates(dates[keep]).to_numpy(),
+        'description': pd.Categorical(descriptions[keep].astype(str).str.strip()),
+        'amount_paise': parsed['amount_paise'][keep].astype('int64').to_numpy(),
+        'is_credit': parsed['is_credit'][keep].to_numpy(),
+    }, columns=TRANSACTION_COLUMNS)
+
+
+def select_top_spends(transactions, n=15):
+    """
+    Returns the n largest spends (debits), largest first.
+
+    Args:
+        transactions (pd.DataFrame): A canonical transaction table.
+        n (int, optional): How many transactions to return.
+
+    Returns:
+        pd.DataFrame: The top n debit rows of transactions.
+    """
+    debits = transactions[~transactions['is_credit']]
+    # nlargest only partially orders the rows instead of sorting all of them
+    return debits.nlargest(n, 'amount_paise')
+
+
+def extract_statement_transactions(pdf_path, password=None, rules=None, extractors=None, recorder=NULL_RECORDER,
+                                   registry_path=LAYOUT_REGISTRY_PATH):
+    """
+    Reads a credit card statement PDF and extracts its transactions.
+
+    Args:
+        pdf_path (str): The path to the PDF credit card statement.
+        password (str, optional): The password for the PDF, if it's protected.
+        rules (CategoryRules, optional): The categorization rules, used to recognise the
+                                         description column. Defaults to DEFAULT_CATEGORY_RULES.
+        extractors (list, optional): Extraction backends to try in order. Defaults to default_extractors().
+        recorder (StageRecorder, optional): Records metrics for each stage of the extraction.
+        registry_path (str, optional): The layout registry to look column mappings up in and
+                                       remember them to. None always infers the columns.
+
+    Returns:
+        pd.DataFrame: The statement's canonical transaction table (see TRANSACTION_COLUMNS).
+                      Returns None if parsing fails.
+    """
+    if rules is None:
+        rules = CategoryRules(DEFAULT_CATEGORY_RULES)
     try:
-        # Step 1: Read the PDF and extract tables
+        # Step 1: Read the PDF and extract tables, page by page, into a single DataFrame
         # For Camelot:
         # 'lattice' mode is good for statements with clear lines separating cells
         # 'stream' mode is good for statements with less defined lines
-        # Adjust pages as needed, e.g., pages='1-end' or specific page numbers
-        tables = camelot.read_pdf(pdf_path, pages='1-2', flavor='lattice', password=password)
+        # All pages are read until the transactions section ends, so long statements aren't cut short.
+        # Header rows are kept here; the amount cleaning below drops them.
+        all_transactions_df = assemble_transactions(pdf_path, password=password, pages='all', flavor='lattice',
+                                                    recorder=recorder, extractors=extractors)
 
-        if not tables:
+        if all_transactions_df.empty:
             print(f"No tables found in {pdf_path}. Check PDF format or parsing mode.")
             return None
 
-        # Concatenate all tables into a single DataFrame
-        for table in tables:
-            # Assuming the first row is the header, but you might need to adjust
-            # based on how your Credit card statement is formatted.
-            # You might need to inspect tables[0].df to identify header rows and remove them.
-            all_transactions_df = pd.concat([all_transactions_df, table.df], ignore_index=True)
-
         # Step 2: Clean and process the DataFrame
         # Credit card statements typically have columns like 'Date', 'Transaction Description', 'Amount' (or 'Debit/Credit')
         # You'll need to identify the correct column names from your actual statement.
@@ -154,155 +1260,957 @@ def analyze_credit_card_statement(pdf_path, password=None):
         # where the transaction description is in a column that contains text like "SWIGGY"
         # and the amount is in a column that contains numerical values for transactions.
         
-        # Let's try to infer columns if not explicitly named by Camelot
-        description_col = all_transactions_df.columns[1]
-        amount_col = all_transactions_df.columns[6]
-        date_col = all_transactions_df.columns[0]  # Default to first column
-
-        # Try to find date column (format: dd/mm/yyyy or dd-mm-yyyy)
-        date_pattern = re.compile(r'\d{2}[-/]\d{2}[-/]\d{4}')
-        for col_name in all_transactions_df.columns:
-            sample_data = all_transactions_df[col_name].astype(str).str.strip()
-            date_matches = sample_data.apply(lambda x: bool(date_pattern.match(x)))
-            if date_matches.sum() / len(sample_data) > 0.5:
-                date_col = col_name
-                break
-
-        # Heuristic: Find a column that contains text that looks like a description (mix of letters and numbers)
-        # and another that looks like an amount (mostly numbers, potentially with decimal/comma)
-        for col_name in all_transactions_df.columns:
-            sample_data = all_transactions_df[col_name].astype(str).str.upper().str.strip()
-            if any("SWIGGY" in s or "ZOMATO" in s or "BLINKIT" in s for s in sample_data):
-                description_col = col_name
-            # Heuristic for amount column: try converting to numeric and check if successful for most
-            try:
-                numeric_series = all_transactions_df[col_name].astype(str).str.replace(',', '').apply(pd.to_numeric, errors='coerce')
-                if numeric_series.count() / len(numeric_series) > 0.7: # If more than 70% can be numeric
-                    amount_col = col_name
-            except Exception:
-                pass
+        # Let's try to infer columns if not explicitly named by Camelot.
+        # Layouts seen before (same issuer, same table shape) come straight from the registry.
+        with recorder.stage('column_inference'):
+            columns = resolve_columns(all_transactions_df, rules, issuer=issuer_from_filename(pdf_path),
+                                      registry_path=registry_path)
+        description_col = columns['description']
+        amount_col = columns['amount']
 
-        if not description_col or not amount_col:
+        if description_col is None or amount_col is None:
             print("Could not identify description or amount columns automatically. Manual inspection needed.")
             print("Extracted DataFrame head:")
             print(all_transactions_df.head())
             print("Please identify the correct column names/indices for transaction description and amount.")
             return None
         
-        # Clean the amount column
-        all_transactions_df[amount_col] = all_transactions_df[amount_col].astype(str).str.replace(',', '').apply(pd.to_numeric, errors='coerce')
-        all_transactions_df.dropna(subset=[amount_col], inplace=True) # Drop rows where amount couldn't be parsed
-
         # Credit Card statements often have separate debit and credit columns,
         # or a single amount column where debits are positive.
         # You'll need to verify how your statement presents spending (debits).
-        # Assuming for now that the extracted 'Amount' column directly represents debits (spends).
+        # Amounts marked 'Cr' (or negative) are flagged as credits; everything else is a debit (spend).
         # If your statement has 'Debit' and 'Credit' columns, you'd combine them:
         # df['Amount'] = df['Debit'].fillna(0) - df['Credit'].fillna(0) # or just df['Debit'] for spends
 
-        # Step 3: Identify Swiggy, Zomato, and Blinkit spends
-        swiggy_spends = 0.0
-        zomato_spends = 0.0
-        blinkit_spends = 0.0
-
-        for index, row in all_transactions_df.iterrows():
-            description = str(row[description_col]).upper() # Ensure string and uppercase for consistent matching
-            amount = float(row[amount_col])
-
-            # Assuming spends are positive amounts in the 'Amount' column.
-            # If your statement has separate debit/credit columns, ensure you're using the debit amount.
-            # If the amount is negative for debits, adjust accordingly (e.g., amount = abs(amount))
-
-            if "SWIGGY" in description:
-                swiggy_spends += amount
-            elif "ZOMATO" in description:
-                zomato_spends += amount
-            elif "BLINKIT" in description:
-                blinkit_spends += amount
-
-        return {
-            "Swiggy": round(swiggy_spends, 2),
-            "Zomato": round(zomato_spends, 2),
-            "Blinkit": round(blinkit_spends, 2)
-        }
+        # Clean the amount column and build the typed transaction table,
+        # dropping rows where the amount couldn't be parsed
+        with recorder.stage('cleaning') as metrics:
+            metrics['rows_in'] = len(all_transactions_df)
+            transactions = build_transaction_table(
+                all_transactions_df[columns['date']],
+                all_transactions_df[description_col],
+                all_transactions_df[amount_col],
+            )
+            metrics['rows_kept'] = len(transactions)
+            metrics['rows_dropped'] = metrics['rows_in'] - metrics['rows_kept']
+        return transactions
 
     except Exception as e:
         print(f"An error occurred: {e}")
         return None
 
-# --- How to use the program ---
-if __name__ == "__main__":
-    statements_folder = os.path.abspath(os.path.join('..', 'statements1')) # Folder containing your PDF statements
-    pdf_password = None # Set to None if not password protected
 
-    monthly_spends_data = {} # To store {month_name: {category: spend}}
+def analyze_credit_card_statement(pdf_path, password=None, rules=None, extractors=None, recorder=NULL_RECORDER,
+                                  normalizer=None, registry_path=LAYOUT_REGISTRY_PATH):
+    """
+    Reads a credit card credit card statement PDF, extracts transactions,
+    and calculates total spends per category (Swiggy, Zomato, and Blinkit by default).
+
+    Args:
+        pdf_path (str): The path to the PDF credit card statement.
+        password (str, optional): The password for the PDF, if it's protected.
+        rules (CategoryRules, optional): The categorization rules. Defaults to DEFAULT_CATEGORY_RULES.
+        extractors (list, optional): Extraction backends to try in order. Defaults to default_extractors().
+        recorder (StageRecorder, optional): Records metrics for each stage of the analysis.
+        normalizer (MerchantNormalizer, optional): Maps descriptions to merchant names, which the
+                                                   rules fall back to where a description matches
+                                                   none. Defaults to DEFAULT_MERCHANT_NORMALIZER.
+        registry_path (str, optional): The layout registry to look column mappings up in and
+                                       remember them to. None always infers the columns.
+
+    Returns:
+        dict: A dictionary with the total spends for each category.
+              Returns None if parsing fails.
+    """
+    if rules is None:
+        rules = CategoryRules(DEFAULT_CATEGORY_RULES)
+    if normalizer is None:
+        normalizer = DEFAULT_MERCHANT_NORMALIZER
+    transactions = extract_statement_transactions(pdf_path, password, rules, extractors, recorder, registry_path)
+    if transactions is None:
+        return None
+
+    # Total up the spends (debits) per category
+    with recorder.stage('categorization') as metrics:
+        spends = transactions[~transactions['is_credit']]
+        metrics['rows'] = len(spends)
+        hits, misses = normalizer.hits, normalizer.misses
+        merchants = normalizer.normalize_series(spends['description'])
+        metrics['merchant_cache_hits'] = normalizer.hits - hits
+        metrics['merchant_cache_misses'] = normalizer.misses - misses
+        return rules.totals(spends['description'], spends['amount_paise'], merchants)
+
+# --- Batch analysis of a statements folder ---
+# Regular expression to extract month (3-letter abbr) and year from filenames
+# Assumes format like "Jan_2025_StandardChartered.pdf"
+FILENAME_PATTERN = re.compile(r'([A-Za-z]{3})_(\d{4})_.*\.pdf')
+
+
+def month_key_from_filename(filename):
+    """
+    Builds the sortable month key (e.g. "2025-01") for a statement filename.
+
+    Args:
+        filename (str): A statement filename such as "Jan_2025_StandardChartered.pdf".
+
+    Returns:
+        str: The "YYYY-MM" month key, or None if the filename doesn't match the expected pattern.
+    """
+    match = FILENAME_PATTERN.match(filename)
+    if not match:
+        return None
+    month_abbr = match.group(1)
+    year = match.group(2)
+    # Convert month abbreviation to month number (1-12)
+    try:
+        month_number = list(calendar.month_abbr).index(month_abbr.capitalize())
+    except ValueError:
+        return None
+    return f"{year}-{month_number:02d}"
+
+
+def list_statement_files(statements_folder):
+    """
+    Lists the statement PDFs in a folder together with their month keys.
 
-    # Regular expression to extract month (3-letter abbr) and year from filenames
-    # Assumes format like "Jan_2025_StandardChartered.pdf"
-    filename_pattern = re.compile(r'([A-Za-z]{3})_(\d{4})_.*\.pdf')
+    Args:
+        statements_folder (str): The folder containing the PDF statements.
 
+    Returns:
+        list: (month_key, filename) tuples in filename order. Files that don't match
+              the expected naming pattern are reported and left out.
+    """
+    statement_files = []
     # Get a sorted list of files to ensure chronological processing
-    pdf_files = sorted([f for f in os.listdir(statements_folder) if f.endswith('.pdf')])
-
-    for filename in pdf_files:
-        match = filename_pattern.match(filename)
-        if match:
-            month_abbr = match.group(1)
-            year = match.group(2)
-            
-            # Convert month abbreviation to month number (1-12)
+    for filename in sorted(f for f in os.listdir(statements_folder) if f.endswith('.pdf')):
+        month_key = month_key_from_filename(filename)
+        if month_key is None:
+            print(f"Filename '{filename}' does not match the expected pattern. Skipping.")
+            continue
+        statement_files.append((month_key, filename))
+    return statement_files
+
+
+def _run_recorded(func, pdf_path, *args):
+    # Runs in the worker process; the events travel back with the result
+    recorder = StageRecorder(source=os.path.basename(pdf_path))
+    result = func(pdf_path, *args, recorder=recorder)
+    return result, recorder.events
+
+
+def _map_over_statements(func, pdf_paths, args, workers=None, hook=None):
+    """
+    Calls func(pdf_path, *args) for every PDF, spread over a pool of worker processes.
+    With a hook, each call is instrumented and its stage events are passed to the hook
+    in this process as the files complete.
+
+    Returns:
+        dict: {pdf_path: result}, where the result is the exception instead if the call
+              raised (a crashed worker only fails its own file, not the whole batch).
+    """
+    workers = workers or os.cpu_count() or 1
+    outcomes = {}
+    call = func if hook is None else partial(_run_recorded, func)
+
+    def record(pdf_path, outcome):
+        if hook is not None and not isinstance(outcome, Exception):
+            outcome, events = outcome
+            for event in events:
+                hook(event)
+        outcomes[pdf_path] = outcome
+
+    if workers == 1 or len(pdf_paths) <= 1:
+        for pdf_path in pdf_paths:
+            print(f"\n--- Analyzing {os.path.basename(pdf_path)} ---")
             try:
-                month_number = list(calendar.month_abbr).index(month_abbr.capitalize())
-            except ValueError:
-                print(f"Could not parse month from filename: {filename}. Skipping.")
-                continue
+                record(pdf_path, call(pdf_path, *args))
+            except Exception as e:
+                record(pdf_path, e)
+        return outcomes
 
-            # Create a sortable key for months (e.g., "2025-01", "2025-02")
-            month_key = f"{year}-{month_number:02d}" 
-            month_name_full = calendar.month_name[month_number] # Full month name for display
+    with ProcessPoolExecutor(max_workers=min(workers, len(pdf_paths))) as pool:
+        futures = {pool.submit(call, pdf_path, *args): pdf_path for pdf_path in pdf_paths}
+        for future in as_completed(futures):
+            pdf_path = futures[future]
+            try:
+                record(pdf_path, future.result())
+            except Exception as e:
+                record(pdf_path, e)
+            print(f"--- Analyzed {os.path.basename(pdf_path)} ---")
+    return outcomes
 
-            pdf_file_path = os.path.join(statements_folder, filename)
-            print(f"\n--- Analyzing {filename} ---")
-            spends = analyze_credit_card_statement(pdf_file_path, pdf_password)
 
-            print(f"Spends for {month_name_full} {year}: {spends}")
+def analyze_statements_folder(statements_folder, password=None, workers=None, rules=None, hook=None, extractors=None,
+                              registry_path=LAYOUT_REGISTRY_PATH):
+    """
+    Analyzes every statement in a folder, spreading the PDFs over a pool of worker processes.
+    Each statement is independent and CPU-bound (lattice detection runs OpenCV and
+    Ghostscript), so this scales with the number of cores.
 
-            if spends:
-                monthly_spends_data[month_key] = spends
-            else:
-                print(f"Failed to analyze {filename}.")
+    Args:
+        statements_folder (str): The folder containing the PDF statements.
+        password (str, optional): The password for the PDFs, if they're protected.
+        workers (int, optional): Number of worker processes. Defaults to the CPU count;
+                                 1 analyzes the files one by one in this process.
+        rules (CategoryRules, optional): The categorization rules. Defaults to DEFAULT_CATEGORY_RULES.
+        hook (callable, optional): Turns on per-stage instrumentation; called with every
+                                   stage event (see StageRecorder), tagged with its filename.
+        extractors (list, optional): Extraction backends to try in order. Defaults to default_extractors().
+        registry_path (str, optional): The layout registry (see resolve_columns). None always infers the columns.
+
+    Returns:
+        tuple: (monthly_spends_data, failures) where monthly_spends_data maps each "YYYY-MM"
+               month key, in sorted order, to the spends per category (as returned by
+               analyze_credit_card_statement, summed over all statements of that month, e.g.
+               one per card), and failures maps each filename that couldn't be analyzed to the reason.
+    """
+    statement_files = list_statement_files(statements_folder)
+    pdf_paths = [os.path.join(statements_folder, filename) for _, filename in statement_files]
+    outcomes = _map_over_statements(partial(analyze_credit_card_statement, registry_path=registry_path), pdf_paths,
+                                    (password, rules, extractors), workers, hook)
 
-            print(monthly_spends_data)
+    monthly_spends_data = {}
+    failures = {}
+    # Assemble in filename order so the results don't depend on which worker finished first
+    for month_key, filename in sorted(statement_files):
+        spends = outcomes[os.path.join(statements_folder, filename)]
+        if isinstance(spends, Exception):
+            failures[filename] = f"{type(spends).__name__}: {spends}"
+        elif not spends:
+            failures[filename] = "No spend data could be extracted"
         else:
-            print(f"Filename '{filename}' does not match the expected pattern. Skipping.")
+            month_spends = monthly_spends_data.setdefault(month_key, {})
+            for category, amount in spends.items():
+                # Rounded to the paisa, so adding up cards doesn't pick up float noise
+                month_spends[category] = round(month_spends.get(category, 0) + amount, 2)
+    return monthly_spends_data, failures
+
+
+# --- Incremental transaction ledger ---
+# Every extracted transaction is stored in SQLite together with the hash of the statement
+# it came from, and per-month, per-category totals are kept up to date as statements are
+# added. A run then only has to parse the statements the ledger hasn't seen yet. Everything
+# is kept per statements folder, so one ledger can serve several folders and a report
+# only ever covers the statements that are in its folder.
+LEDGER_PATH = os.path.join(os.path.expanduser('~'), '.local', 'share', 'credit_card_statement_analyzer', 'ledger.sqlite3')
+
+# Bumped whenever the schema changes; an older ledger is rebuilt from the statements (whose
+# tables are still in the extraction cache) rather than migrated
+LEDGER_SCHEMA_VERSION = 4
+LEDGER_SCHEMA = """
+CREATE TABLE IF NOT EXISTS statements (
+    folder TEXT NOT NULL,
+    file_hash TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    month_key TEXT NOT NULL,
+    ingested_at REAL NOT NULL,
+    PRIMARY KEY (folder, file_hash)
+);
+CREATE TABLE IF NOT EXISTS transactions (
+    id INTEGER PRIMARY KEY,
+    folder TEXT NOT NULL,
+    file_hash TEXT NOT NULL,
+    month_key TEXT NOT NULL,
+    date TEXT,
+    description TEXT,
+    merchant TEXT,
+    amount_paise INTEGER NOT NULL,
+    is_credit INTEGER NOT NULL,
+    category TEXT
+);
+CREATE INDEX IF NOT EXISTS transactions_month ON transactions(folder, month_key);
+CREATE INDEX IF NOT EXISTS transactions_file ON transactions(folder, file_hash);
+CREATE INDEX IF NOT EXISTS transactions_description ON transactions(description);
+CREATE TABLE IF NOT EXISTS monthly_category_totals (
+    folder TEXT NOT NULL,
+    month_key TEXT NOT NULL,
+    category TEXT NOT NULL,
+    total_paise INTEGER NOT NULL,
+    PRIMARY KEY (folder, month_key, category)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class TransactionLedger:
+    """
+    A persistent SQLite store of extracted transactions and their monthly category totals.
+    """
+
+    def __init__(self, path=LEDGER_PATH):
+        """
+        Args:
+            path (str, optional): The SQLite database file (':memory:' for a throwaway ledger).
+        """
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] != LEDGER_SCHEMA_VERSION:
+            self.conn.executescript(
+                "DROP TABLE IF EXISTS transactions; DROP TABLE IF EXISTS monthly_category_totals; "
+                "DROP TABLE IF EXISTS statements; DROP TABLE IF EXISTS meta;")
+            self.conn.execute(f"PRAGMA user_version = {LEDGER_SCHEMA_VERSION}")
+        self.conn.executescript(LEDGER_SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def statement_hashes(self, folder):
+        """
+        Returns the set of content hashes of the folder's statements in the ledger.
+        """
+        return {row[0] for row in self.conn.execute("SELECT file_hash FROM statements WHERE folder = ?", (folder,))}
+
+    def add_statement(self, folder, file_hash, filename, month_key, transactions, rules, normalizer=None,
+                      recorder=NULL_RECORDER):
+        """
+        Adds a statement's transactions and updates the totals of its month. An earlier
+        version of the same file (same filename, different contents) is replaced, and so
+        is an earlier copy of the same statement.
+
+        Args:
+            folder (str): The absolute path of the statements folder the statement is in.
+            file_hash (str): The statement's SHA-256.
+            filename (str): The statement's filename.
+            month_key (str): The statement's "YYYY-MM" month key.
+            transactions (pd.DataFrame): A canonical transaction table, as returned by
+                                         extract_statement_transactions.
+            rules (CategoryRules): The categorization rules.
+            normalizer (MerchantNormalizer, optional): Maps descriptions to merchant names.
+                                                       Defaults to DEFAULT_MERCHANT_NORMALIZER.
+            recorder (StageRecorder, optional): Records the categorization stage.
+        """
+        if normalizer is None:
+            normalizer = DEFAULT_MERCHANT_NORMALIZER
+        with recorder.stage('categorization') as metrics:
+            metrics['rows'] = len(transactions)
+            hits, misses = normalizer.hits, normalizer.misses
+            merchants = normalizer.normalize_series(transactions['description'])
+            metrics['merchant_cache_hits'] = normalizer.hits - hits
+            metrics['merchant_cache_misses'] = normalizer.misses - misses
+            categories = rules.categorize(transactions['description'], merchants)
+        rows = list(zip(
+            [folder] * len(transactions),
+            [file_hash] * len(transactions),
+            [month_key] * len(transactions),
+            transactions['date'].dt.strftime('%Y-%m-%d').astype(object).where(transactions['date'].notna(), None),
+            transactions['description'].astype(str),
+            merchants.astype(object).where(merchants.notna(), None),
+            transactions['amount_paise'].astype(int).tolist(),
+            transactions['is_credit'].astype(int).tolist(),
+            categories.where(categories.notna(), None),
+        ))
+        with self.conn: # One SQLite transaction, so a statement is either fully in the ledger or not at all
+            stale_months = {month_key}
+            for (old_hash,) in self.conn.execute(
+                    "SELECT file_hash FROM statements WHERE folder = ? AND (filename = ? OR file_hash = ?)",
+                    (folder, filename, file_hash)).fetchall():
+                stale_months.update(self._delete_statement(folder, old_hash))
+            self.conn.execute("INSERT INTO statements VALUES (?, ?, ?, ?, ?)",
+                              (folder, file_hash, filename, month_key, time.time()))
+            self.conn.executemany(
+                "INSERT INTO transactions (folder, file_hash, month_key, date, description, merchant, amount_paise, "
+                "is_credit, category) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows)
+            self._refresh_totals(folder, stale_months)
+
+    def _delete_statement(self, folder, file_hash):
+        months = [row[0] for row in self.conn.execute(
+            "SELECT DISTINCT month_key FROM statements WHERE folder = ? AND file_hash = ?", (folder, file_hash))]
+        self.conn.execute("DELETE FROM transactions WHERE folder = ? AND file_hash = ?", (folder, file_hash))
+        self.conn.execute("DELETE FROM statements WHERE folder = ? AND file_hash = ?", (folder, file_hash))
+        return months
+
+    def _refresh_totals(self, folder, month_keys):
+        # Only the given months are recomputed, from their own debits
+        for month_key in month_keys:
+            self.conn.execute("DELETE FROM monthly_category_totals WHERE folder = ? AND month_key = ?",
+                              (folder, month_key))
+            self.conn.execute(
+                "INSERT INTO monthly_category_totals (folder, month_key, category, total_paise) "
+                "SELECT folder, month_key, category, SUM(amount_paise) FROM transactions "
+                "WHERE folder = ? AND month_key = ? AND category IS NOT NULL AND NOT is_credit "
+                "GROUP BY month_key, category",
+                (folder, month_key))
+
+    def prune_statements(self, folder, present_hashes):
+        """
+        Removes the folder's statements whose files are no longer in it, and updates the
+        totals of their months.
+
+        Args:
+            folder (str): The absolute path of the statements folder.
+            present_hashes (set): Content hashes of the statements currently in the folder.
+
+        Returns:
+            list: The filenames of the removed statements.
+        """
+        removed = []
+        with self.conn:
+            stale_months = set()
+            for file_hash, filename in self.conn.execute(
+                    "SELECT file_hash, filename FROM statements WHERE folder = ?", (folder,)).fetchall():
+                if file_hash not in present_hashes:
+                    stale_months.update(self._delete_statement(folder, file_hash))
+                    removed.append(filename)
+            self._refresh_totals(folder, stale_months)
+        return removed
+
+    def sync_rules(self, rules, normalizer=None):
+        """
+        Re-normalizes and re-categorizes the stored transactions if the categorization rules
+        or the merchant normalization changed since the last run. Only the distinct
+        descriptions are matched again; no PDF is re-read.
+        """
+        if normalizer is None:
+            normalizer = DEFAULT_MERCHANT_NORMALIZER
+        signature = f"{rules.signature}:{normalizer.signature}"
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'rules_signature'").fetchone()
+        if row and row[0] == signature:
+            return
+        descriptions = pd.Series([row[0] for row in self.conn.execute("SELECT DISTINCT description FROM transactions")],
+                                 dtype=object)
+        merchants = normalizer.normalize_series(descriptions)
+        categories = rules.categorize(descriptions, merchants)
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE transactions SET merchant = ?, category = ? WHERE description = ?",
+                [(merchant if isinstance(merchant, str) else None, category if isinstance(category, str) else None,
+                  description)
+                 for description, merchant, category in zip(descriptions, merchants, categories)])
+            folder_months = self.conn.execute("SELECT DISTINCT folder, month_key FROM statements").fetchall()
+            self.conn.execute("DELETE FROM monthly_category_totals")
+            for folder, month_key in folder_months:
+                self._refresh_totals(folder, [month_key])
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('rules_signature', ?)", (signature,))
+
+    def monthly_spends(self, categories, folder):
+        """
+        Returns a folder's monthly totals in the same shape as analyze_statements_folder.
+
+        Args:
+            categories (list): The categories to report; missing ones are 0.
+            folder (str): The absolute path of the statements folder.
+
+        Returns:
+            dict: {month_key: {category: total}} in month order, for every month with a statement.
+        """
+        monthly_spends_data = {
+            row[0]: {category: 0.0 for category in categories}
+            for row in self.conn.execute(
+                "SELECT DISTINCT month_key FROM statements WHERE folder = ? ORDER BY month_key", (folder,))
+        }
+        for month_key, category, total_paise in self.conn.execute(
+                "SELECT month_key, category, total_paise FROM monthly_category_totals WHERE folder = ?", (folder,)):
+            if category in monthly_spends_data[month_key]:
+                monthly_spends_data[month_key][category] = total_paise / 100
+        return monthly_spends_data
+
+    def transactions_frame(self, folder=None):
+        """
+        Returns the stored transactions of a folder (or of every folder, if None) as a
+        canonical transaction table (see TRANSACTION_COLUMNS) with additional 'month_key',
+        'merchant' and 'category' columns.
+        """
+        stored = pd.read_sql_query(
+            "SELECT month_key, date, description, merchant, amount_paise, is_credit, category FROM transactions "
+            + ("WHERE folder = ? " if folder is not None else "") + "ORDER BY id",
+            self.conn, params=(folder,) if folder is not None else None)
+        return pd.DataFrame({
+            'date': pd.to_datetime(stored['date'], format='%Y-%m-%d'),
+            'description': stored['description'].astype('category'),
+            'amount_paise': stored['amount_paise'].astype('int64'),
+            'is_credit': stored['is_credit'].astype(bool),
+            'month_key': stored['month_key'].astype('category'),
+            'merchant': stored['merchant'].astype('category'),
+            'category': stored['category'].astype('category'),
+        })
+
+
+def ingest_statements_folder(statements_folder, ledger, password=None, workers=None, rules=None, hook=None,
+                             extractors=None, normalizer=None, prune=True, registry_path=LAYOUT_REGISTRY_PATH):
+    """
+    Adds the statements in a folder that the ledger hasn't seen yet. Statements are
+    recognised by content hash, so unchanged files (and extra copies of a file) are
+    skipped without being parsed.
+
+    Args:
+        statements_folder (str): The folder containing the PDF statements.
+        ledger (TransactionLedger): The ledger to add to.
+        password (str, optional): The password for the PDFs, if they're protected.
+        workers (int, optional): Number of worker processes for the new statements.
+        rules (CategoryRules, optional): The categorization rules. Defaults to DEFAULT_CATEGORY_RULES.
+        hook (callable, optional): Turns on per-stage instrumentation of the new statements;
+                                   called with every stage event (see StageRecorder).
+        extractors (list, optional): Extraction backends to try in order. Defaults to default_extractors().
+        normalizer (MerchantNormalizer, optional): Maps descriptions to merchant names.
+                                                   Defaults to DEFAULT_MERCHANT_NORMALIZER.
+        prune (bool, optional): Also remove statements from the ledger whose files are no
+                                longer in the folder.
+        registry_path (str, optional): The layout registry (see resolve_columns). None always infers the columns.
+
+    Returns:
+        tuple: (ingested, failures) where ingested lists the newly added filenames and
+               failures maps each filename that couldn't be analyzed to the reason.
+    """
+    if rules is None:
+        rules = CategoryRules(DEFAULT_CATEGORY_RULES)
+    ledger.sync_rules(rules, normalizer)
+
+    folder = os.path.abspath(statements_folder)
+    known_hashes = ledger.statement_hashes(folder)
+    present_hashes = set()
+    pending = []
+    for month_key, filename in list_statement_files(folder):
+        pdf_path = os.path.join(folder, filename)
+        file_hash = file_sha256(pdf_path)
+        if file_hash not in known_hashes and file_hash not in present_hashes:
+            pending.append((month_key, filename, pdf_path, file_hash))
+        present_hashes.add(file_hash)
+    if prune:
+        for filename in ledger.prune_statements(folder, present_hashes):
+            print(f"Removed {filename} from the ledger; it is no longer in {folder}")
+
+    outcomes = _map_over_statements(partial(extract_statement_transactions, registry_path=registry_path),
+                                    [item[2] for item in pending], (password, rules, extractors), workers, hook)
+    ingested = []
+    failures = {}
+    for month_key, filename, pdf_path, file_hash in pending:
+        transactions = outcomes[pdf_path]
+        if isinstance(transactions, Exception):
+            failures[filename] = f"{type(transactions).__name__}: {transactions}"
+        elif transactions is None or transactions.empty:
+            failures[filename] = "No transactions could be extracted"
+        else:
+            # Categorization happens here rather than in the workers, so it is recorded here too
+            recorder = StageRecorder(source=filename, hook=hook) if hook is not None else NULL_RECORDER
+            ledger.add_statement(folder, file_hash, filename, month_key, transactions, rules, normalizer, recorder)
+            ingested.append(filename)
+    return ingested, failures
+
+
+def watch_statements_folder(statements_folder, ledger, interval=60, password=None, workers=None, rules=None, hook=None,
+                            extractors=None, normalizer=None, registry_path=LAYOUT_REGISTRY_PATH):
+    """
+    Polls a folder and ingests new statements into the ledger as they land, until interrupted.
+
+    Args:
+        statements_folder (str): The folder to watch.
+        ledger (TransactionLedger): The ledger to add to.
+        interval (float, optional): Seconds between polls.
+        password (str, optional): The password for the PDFs, if they're protected.
+        workers (int, optional): Number of worker processes for new statements.
+        rules (CategoryRules, optional): The categorization rules. Defaults to DEFAULT_CATEGORY_RULES.
+        hook (callable, optional): Called with every stage event of the ingested statements.
+        extractors (list, optional): Extraction backends to try in order. Defaults to default_extractors().
+        normalizer (MerchantNormalizer, optional): Maps descriptions to merchant names; its
+                                                   cache is saved after every poll.
+        registry_path (str, optional): The layout registry (see resolve_columns). None always infers the columns.
+    """
+    if normalizer is None:
+        normalizer = DEFAULT_MERCHANT_NORMALIZER
+    print(f"Watching {statements_folder} for new statements (Ctrl+C to stop)...")
+    try:
+        while True:
+            ingested, failures = ingest_statements_folder(statements_folder, ledger, password, workers, rules, hook,
+                                                          extractors, normalizer, registry_path=registry_path)
+            normalizer.save()
+            for filename in ingested:
+                print(f"Ingested {filename}")
+            for filename, reason in failures.items():
+                print(f"Failed to analyze {filename}: {reason}")
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        print("Stopped watching.")
+
+
+# --- Cross-month queries ---
+class TransactionQuery:
+    """
+    Answers questions over all analyzed transactions, held in memory as one table, so
+    charts, tables and summaries never have to go back to the PDFs.
+    """
+
+    def __init__(self, transactions):
+        """
+        Args:
+            transactions (pd.DataFrame): A canonical transaction table with 'month_key', 'merchant'
+                                         and 'category' columns, e.g. TransactionLedger.transactions_frame().
+        """
+        self.transactions = transactions
+        self.debits = transactions[~transactions['is_credit']]
+        self.month_keys = sorted(transactions['month_key'].astype(str).unique())
+
+    def _select(self, start=None, end=None, months=None):
+        debits = self.debits
+        if start is not None:
+            debits = debits[debits['date'] >= pd.Timestamp(start)]
+        if end is not None:
+            debits = debits[debits['date'] <= pd.Timestamp(end)]
+        if months is not None:
+            debits = debits[debits['month_key'].isin(months)]
+        return debits
+
+    def top_spends(self, n=15, start=None, end=None, months=None):
+        """
+        Returns the n largest spends, largest first.
+
+        Args:
+            n (int, optional): How many spends to return.
+            start (str or datetime, optional): Only spends on or after this date.
+            end (str or datetime, optional): Only spends on or before this date.
+            months (list, optional): Only spends from the statements of these "YYYY-MM" months.
+
+        Returns:
+            pd.DataFrame: The top n transactions.
+        """
+        return select_top_spends(self._select(start, end, months), n)
+
+    def merchant_rollup(self, start=None, end=None, months=None):
+        """
+        Totals spends per merchant.
+
+        Returns:
+            pd.DataFrame: Indexed by canonical merchant name, with 'transactions' (count) and 'total' (INR)
+                          columns, largest total first.
+        """
+        grouped = self._select(start, end, months).groupby('merchant', observed=True)['amount_paise']
+        rollup = pd.DataFrame({'transactions': grouped.size(), 'total': grouped.sum() / 100})
+        return rollup.sort_values('total', ascending=False)
+
+    def category_monthly_series(self, categories=None):
+        """
+        Totals spends per category and statement month.
+
+        Args:
+            categories (list, optional): The categories to include, in column order. Defaults to
+                                         every category that has spends.
+
+        Returns:
+            pd.DataFrame: Indexed by "YYYY-MM" month key (every analyzed month, in order), one
+                          column per category, in INR.
+        """
+        categorized = self.debits.dropna(subset=['category'])
+        totals = (categorized.groupby([categorized['month_key'].astype(str), 'category'], observed=True)['amount_paise']
+                  .sum().unstack(fill_value=0))
+        if categories is None:
+            categories = list(totals.columns)
+        totals = totals.reindex(index=self.month_keys, columns=categories, fill_value=0)
+        return totals.fillna(0) / 100
+
+    def category_period_series(self, categories=None, period='M'):
+        """
+        Totals spends per category and calendar period.
+
+        Args:
+            categories (list, optional): The categories to include, as for category_monthly_series.
+            period (str, optional): 'M' (statement month), 'Q' (quarter) or 'Y' (year).
+
+        Returns:
+            pd.DataFrame: Indexed by period label ("2025-01", "2025Q1" or "2025"), one column
+                          per category, in INR.
+        """
+        series = self.category_monthly_series(categories)
+        if period == 'M':
+            return series
+        periods = pd.PeriodIndex(series.index, freq='M').asfreq(period)
+        rolled = series.groupby(periods).sum()
+        rolled.index = rolled.index.astype(str)
+        return rolled
+
+    def month_over_month(self, categories=None, percent=False):
+        """
+        Returns the change of each category's spends against the previous month (NaN for the
+        first month), in INR or, with percent=True, as a percentage.
+        """
+        series = self.category_monthly_series(categories)
+        return series.pct_change(fill_method=None) * 100 if percent else series.diff()
+
+
+# --- Static report export ---
+# A report is drawn from the pre-aggregated query results only, never from individual
+# transactions, and long archives are rolled up to quarters or years, so a report over
+# ten years of statements is no bigger and no slower to render than one over a year.
+REPORT_MAX_POINTS = 36 # Most periods on the report's x-axis
+REPORT_TOP_N = 15
+
 
-    if not monthly_spends_data:
+def report_period(month_count, max_points=REPORT_MAX_POINTS):
+    """
+    Returns the finest period ('M', 'Q' or 'Y') that shows month_count months in at most
+    max_points points (years are used beyond that, whatever the count).
+    """
+    if month_count <= max_points:
+        return 'M'
+    if month_count <= max_points * 3:
+        return 'Q'
+    return 'Y'
+
+
+def build_report_figure(query, categories, max_points=REPORT_MAX_POINTS, top_n=REPORT_TOP_N):
+    """
+    Builds the report as a single Plotly figure: spends per category over time, the period
+    totals, the top merchants across the archive and the largest spends of the latest period.
+
+    Args:
+        query (TransactionQuery): The transactions to report on.
+        categories (list): The categories to chart, in order.
+        max_points (int, optional): Most periods on the chart before rolling up.
+        top_n (int, optional): Rows in the merchant and top spends tables.
+
+    Returns:
+        tuple: (plotly Figure, period) where period is 'M', 'Q' or 'Y'.
+    """
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+
+    period = report_period(len(query.month_keys), max_points)
+    series = query.category_period_series(categories, period)
+    period_name = {'M': 'Month', 'Q': 'Quarter', 'Y': 'Year'}[period]
+
+    latest = series.index[-1] if len(series) else None
+    latest_months = [key for key in query.month_keys
+                     if latest is not None and str(pd.Period(key, freq='M').asfreq(period)) == latest]
+    top_spends = query.top_spends(top_n, months=latest_months)
+    merchants = query.merchant_rollup().head(top_n)
+
+    fig = make_subplots(
+        rows=4, cols=1,
+        specs=[[{'type': 'xy'}], [{'type': 'table'}], [{'type': 'table'}], [{'type': 'table'}]],
+        row_heights=[0.4, 0.2, 0.2, 0.2], vertical_spacing=0.04,
+        subplot_titles=[
+            f"Spends by Category per {period_name}",
+            f"Spends per {period_name} (INR)",
+            f"Top {top_n} Merchants (all statements)",
+            f"Top {top_n} Spends ({latest or 'no data'})",
+        ])
+    for category in categories:
+        fig.add_trace(go.Scatter(x=list(series.index), y=series[category].tolist(), mode='lines+markers',
+                                 name=category), row=1, col=1)
+    fig.add_trace(go.Table(
+        header=dict(values=[period_name] + list(categories), fill_color='paleturquoise', align='left'),
+        cells=dict(values=[list(series.index)] + [series[category].map('{:,.2f}'.format).tolist()
+                                                  for category in categories],
+                   fill_color='lavender', align='left')), row=2, col=1)
+    fig.add_trace(go.Table(
+        header=dict(values=["Merchant", "Transactions", "Total (INR)"], fill_color='paleturquoise', align='left'),
+        cells=dict(values=[merchants.index.astype(str).tolist(), merchants['transactions'].tolist(),
+                           merchants['total'].map('{:,.2f}'.format).tolist()],
+                   fill_color='lavender', align='left')), row=3, col=1)
+    fig.add_trace(go.Table(
+        header=dict(values=["Date", "Description", "Amount (INR)"], fill_color='paleturquoise', align='left'),
+        cells=dict(values=[top_spends['date'].dt.strftime('%d %b %Y').tolist(),
+                           top_spends['description'].astype(str).str[:50].tolist(),
+                           (top_spends['amount_paise'] / 100).map('{:,.2f}'.format).tolist()],
+                   fill_color='lavender', align='left')), row=4, col=1)
+    fig.update_layout(
+        title=f"Credit Card Spends Report ({query.month_keys[0]} to {query.month_keys[-1]})" if query.month_keys
+              else "Credit Card Spends Report",
+        legend_title='Category', template='plotly_white', width=1100, height=1800)
+    return fig, period
+
+
+def export_report(query, categories, path, max_points=REPORT_MAX_POINTS, top_n=REPORT_TOP_N):
+    """
+    Writes the report to a self-contained HTML file (plotly.js is embedded, so it opens
+    offline) or a PNG image, chosen by the file extension. No browser is opened.
+
+    Args:
+        query (TransactionQuery): The transactions to report on.
+        categories (list): The categories to chart, in order.
+        path (str): The .html or .png file to write.
+        max_points (int, optional): Most periods on the chart before rolling up.
+        top_n (int, optional): Rows in the merchant and top spends tables.
+
+    Returns:
+        str: The period the chart was drawn at ('M', 'Q' or 'Y').
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in ('.html', '.htm', '.png'):
+        raise ValueError(f"Unsupported report format {extension!r}; use .html or .png")
+    fig, period = build_report_figure(query, categories, max_points, top_n)
+    if extension == '.png':
+        fig.write_image(path) # Needs the kaleido package
+    else:
+        fig.write_html(path, include_plotlyjs=True, full_html=True)
+    return period
+
+
+def write_monthly_summary(monthly_spends_data, categories, out, fmt='json'):
+    """
+    Writes the monthly spends summary in a machine-readable format.
+
+    Args:
+        monthly_spends_data (dict): {month_key: {category: spend}} as returned by analyze_statements_folder.
+        categories (list): The categories to include, in column order.
+        out (file): The text stream to write to.
+        fmt (str, optional): 'json' for {month_key: {category: spend}}, or 'csv' for one row per month.
+    """
+    months = sorted(monthly_spends_data)
+    if fmt == 'json':
+        summary = {month_key: {category: monthly_spends_data[month_key].get(category, 0) for category in categories}
+                   for month_key in months}
+        json.dump(summary, out, indent=2)
+        out.write('\n')
+    elif fmt == 'csv':
+        writer = csv.writer(out)
+        writer.writerow(['month'] + list(categories))
+        for month_key in months:
+            writer.writerow([month_key] + [monthly_spends_data[month_key].get(category, 0) for category in categories])
+    else:
+        raise ValueError(f"Unknown summary format: {fmt}")
+
+
+# --- How to use the program ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Analyze credit card statement PDFs for spends per merchant category.")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Number of statements to analyze in parallel (defaults to the CPU count)")
+    parser.add_argument('--rules', default=None,
+                        help="CSV rule table (pattern,category,priority[,regex]); defaults to Swiggy, Zomato and Blinkit")
+    parser.add_argument('--statements-dir', default=os.path.join('..', 'statements1'),
+                        help="Folder containing your PDF statements (default: ../statements1)")
+    parser.add_argument('--headless', action='store_true',
+                        help="Don't draw any charts; write the monthly summary to stdout instead")
+    parser.add_argument('--format', choices=['json', 'csv'], default='json',
+                        help="Format of the --headless summary (default: json)")
+    parser.add_argument('--ledger', default=LEDGER_PATH,
+                        help="SQLite ledger of already analyzed statements; only new statements are parsed")
+    parser.add_argument('--watch', action='store_true',
+                        help="Keep running and ingest new statements into the ledger as they land in the folder")
+    parser.add_argument('--interval', type=float, default=60,
+                        help="Seconds between folder checks in --watch mode (default: 60)")
+    parser.add_argument('--extractor', choices=['auto', 'text', 'camelot'], default='auto',
+                        help="auto reads the PDF text layer and falls back to Camelot lattice detection when it "
+                             "doesn't validate; text and camelot use only that backend (default: auto)")
+    parser.add_argument('--top-since', default=None,
+                        help="Show the top spends from this date (YYYY-MM-DD) on instead of the last month's")
+    parser.add_argument('--top-until', default=None,
+                        help="Show the top spends up to this date (YYYY-MM-DD) instead of the last month's")
+    parser.add_argument('--layout-registry', default=LAYOUT_REGISTRY_PATH,
+                        help="File remembering each statement layout's date/description/amount columns")
+    parser.add_argument('--no-layout-registry', action='store_true',
+                        help="Infer the columns of every statement instead of using or updating the layout registry")
+    parser.add_argument('--reset-layout-registry', action='store_true',
+                        help="Forget all remembered layouts before analyzing, e.g. after a wrong column inference")
+    parser.add_argument('--merchant-cache', nargs='?', const=MERCHANT_CACHE_PATH, default=None,
+                        help="Keep the merchant name cache between runs in this JSON file "
+                             f"(default when given without a path: {MERCHANT_CACHE_PATH})")
+    parser.add_argument('--merchant-cache-size', type=int, default=MERCHANT_CACHE_SIZE,
+                        help=f"Maximum number of memoized merchant descriptions (default: {MERCHANT_CACHE_SIZE})")
+    parser.add_argument('--report', default=None,
+                        help="Write a self-contained .html (or .png) report to this file instead of opening charts")
+    parser.add_argument('--report-max-points', type=int, default=REPORT_MAX_POINTS,
+                        help="Roll the report up to quarters or years beyond this many months "
+                             f"(default: {REPORT_MAX_POINTS})")
+    parser.add_argument('--metrics', default=None,
+                        help="Record per-stage timing and memory of every analyzed statement as JSON lines in this file "
+                             "(and summarize them at the end, unless watching)")
+    args = parser.parse_args()
+
+    rules = load_category_rules(args.rules) if args.rules else CategoryRules(DEFAULT_CATEGORY_RULES)
+    extractors = {
+        'auto': default_extractors(),
+        'text': [TextLayerExtractor()],
+        'camelot': [CamelotExtractor()],
+    }[args.extractor]
+    normalizer = MerchantNormalizer(max_size=args.merchant_cache_size, cache_path=args.merchant_cache)
+    if args.reset_layout_registry:
+        reset_layout_registry(args.layout_registry)
+    registry_path = None if args.no_layout_registry else args.layout_registry
+
+    statements_folder = os.path.abspath(args.statements_dir)
+    pdf_password = None # Set to None if not password protected
+    ledger = TransactionLedger(args.ledger)
+
+    stage_events = []
+    metrics_file = None
+    hook = None
+    if args.metrics:
+        metrics_file = open(args.metrics, 'a')
+        write_event = json_lines_hook(metrics_file)
+
+        def hook(event):
+            write_event(event)
+            # The summary is printed at the end of a one-off run. A watcher never gets there,
+            # so it only writes the events out instead of holding on to every one of them.
+            if not args.watch:
+                stage_events.append(event)
+
+    if args.watch:
+        watch_statements_folder(statements_folder, ledger, args.interval, pdf_password, workers=args.workers, rules=rules,
+                                hook=hook, extractors=extractors, normalizer=normalizer, registry_path=registry_path)
+        ledger.close()
+        if metrics_file is not None:
+            metrics_file.close()
+        sys.exit(0)
+
+    # In headless mode stdout carries only the summary, so progress messages go to stderr
+    with redirect_stdout(sys.stderr if args.headless else sys.stdout):
+        # Only statements the ledger hasn't seen are parsed; the rest come from stored totals
+        ingested, failures = ingest_statements_folder(statements_folder, ledger, pdf_password, workers=args.workers, rules=rules,
+                                                      hook=hook, extractors=extractors, normalizer=normalizer,
+                                                      registry_path=registry_path)
+        normalizer.save()
+        # To store {month_key: {category: spend}}
+        monthly_spends_data = ledger.monthly_spends(rules.categories, statements_folder)
+
+        for month_key, spends in monthly_spends_data.items():
+            year, month_num_str = month_key.split('-')
+            print(f"Spends for {calendar.month_name[int(month_num_str)]} {year}: {spends}")
+        for filename, reason in failures.items():
+            print(f"Failed to analyze {filename}: {reason}")
+        if normalizer.hits or normalizer.misses:
+            print(f"Merchant names: {normalizer.hits} cache hits, {normalizer.misses} misses")
+
+        if metrics_file is not None:
+            metrics_file.close()
+            print(f"\n--- Stage metrics (also written to {args.metrics}) ---")
+            for source, stages in summarize_stage_events(stage_events).items():
+                print(source)
+                for stage, totals in stages.items():
+                    memory_mb = totals.get('peak_memory_bytes', 0) / 1e6
+                    print(f"  {stage:<18} {totals['wall_s'] * 1000:10.1f} ms {memory_mb:8.1f} MB"
+                          + (f"  ({totals['errors']} failed)" if totals['errors'] else ''))
+
+    if args.headless or args.report:
+        # A report replaces the interactive charts, so nothing needs a browser
+        if args.report:
+            period = export_report(TransactionQuery(ledger.transactions_frame(statements_folder)), rules.categories,
+                                   args.report, args.report_max_points)
+            print(f"Report written to {args.report} (one point per {dict(M='month', Q='quarter', Y='year')[period]})",
+                  file=sys.stderr if args.headless else sys.stdout)
+        if args.headless:
+            write_monthly_summary(monthly_spends_data, rules.categories, sys.stdout, fmt=args.format)
+    elif not monthly_spends_data:
         print("No valid monthly spend data found to plot.")
     else:
+        import plotly.graph_objects as go
+
+        # Everything below is built from the transactions already in the ledger
+        query = TransactionQuery(ledger.transactions_frame(statements_folder))
+        categories = rules.categories # The keys returned by analyze_credit_card_statement
+        monthly_series = query.category_monthly_series(categories)
+
         # Sort data by month key (e.g., "2025-01", "2025-02")
-        sorted_months = sorted(monthly_spends_data.keys())
-        
-        # Prepare data for plotting
-        categories = ["Swiggy", "Zomato", "Blinkit"] # The keys returned by analyze_credit_card_statement
-        
-        # Initialize dictionaries to hold spend data for each category across months
-        category_spends_for_plotting = {category: [] for category in categories}
-        display_months = [] # To store month names for x-axis labels
-
-                # ...existing code up to...
-        for month_key in sorted_months:
-            spends_for_month = monthly_spends_data[month_key]
-            print(f"Processing month: {month_key} with spends: {spends_for_month}")
-            year, month_num_str = month_key.split('-')
-            month_name = calendar.month_abbr[int(month_num_str)]
-            display_months.append(f"{month_name} {year}")
-            for category in categories:
-                category_spends_for_plotting[category].append(spends_for_month.get(category, 0))
+        sorted_months = list(monthly_series.index)
+        display_months = [
+            f"{calendar.month_abbr[int(month_key[5:])]} {month_key[:4]}" for month_key in sorted_months
+        ] # To store month names for x-axis labels
         
         # --- Plotly Interactive Line Chart ---
         fig = go.Figure()
         for category in categories:
-            spends_list = category_spends_for_plotting[category]
+            spends_list = monthly_series[category].tolist()
             if any(s > 0 for s in spends_list):
                 fig.add_trace(go.Scatter(
                     x=display_months,
@@ -314,7 +2222,7 @@ if __name__ == "__main__":
                 print(f"No spends found for {category} across the analyzed months. Not including in combined plot.")
         
         fig.update_layout(
-            title='Monthly Spends by Category (Swiggy, Zomato, Blinkit)',
+            title=f"Monthly Spends by Category ({', '.join(categories)})",
             xaxis_title='Month',
             yaxis_title='Spend (INR)',
             legend_title='Category',
@@ -325,91 +2233,43 @@ if __name__ == "__main__":
         )
         fig.show()
         
-        # --- Show Top 15 Spends of the Last Month in a Grid (Plotly Table) ---
+        # --- Show Top 15 Spends of the Last Month (or the --top-since/--top-until range) in a Grid (Plotly Table) ---
         if sorted_months:
-            last_month_key = sorted_months[-1]
-            last_month_filename = None
-            for filename in pdf_files:
-                match = filename_pattern.match(filename)
-                if match:
-                    month_abbr = match.group(1)
-                    year = match.group(2)
-                    month_number = list(calendar.month_abbr).index(month_abbr.capitalize())
-                    month_key = f"{year}-{month_number:02d}"
-                    if month_key == last_month_key:
-                        last_month_filename = filename
-                        break
-        
-            if last_month_filename:
-                pdf_file_path = os.path.join(statements_folder, last_month_filename)
-                tables = camelot.read_pdf(pdf_file_path, pages='1-2', flavor='lattice', password=pdf_password)
-                all_transactions_df = pd.DataFrame()
-                for table in tables:
-                    all_transactions_df = pd.concat([all_transactions_df, table.df], ignore_index=True)
-                all_transactions_df.dropna(subset=[all_transactions_df.columns[0]], inplace=True)
-        
-                # Infer columns as before
-                description_col = all_transactions_df.columns[1]
-                amount_col = all_transactions_df.columns[6]
-                date_col = all_transactions_df.columns[0]
-                date_pattern = re.compile(r'\d{2}[-/]\d{2}[-/]\d{4}')
-                
-                for col_name in all_transactions_df.columns:
-                    sample_data = all_transactions_df[col_name].astype(str).str.strip()
-                    date_matches = sample_data.apply(lambda x: bool(date_pattern.match(x)))
-                    if date_matches.sum() / len(sample_data) > 0.5:
-                        date_col = col_name
-                        break
-                
-                for col_name in all_transactions_df.columns:
-                    sample_data = all_transactions_df[col_name].astype(str).str.upper().str.strip()
-                    if any("SWIGGY" in s or "ZOMATO" in s or "BLINKIT" in s for s in sample_data):
-                        description_col = col_name
-                    try:
-                        numeric_series = all_transactions_df[col_name].astype(str).str.replace(',', '').apply(pd.to_numeric, errors='coerce')
-                        if numeric_series.count() / len(numeric_series) > 0.7:
-                            amount_col = col_name
-                    except Exception:
-                        pass
-        
-                all_transactions_df[amount_col] = all_transactions_df[amount_col].astype(str).str.replace(',', '').apply(pd.to_numeric, errors='coerce')
-                all_transactions_df.dropna(subset=[amount_col], inplace=True)
-        
-                # Sort by amount descending and get top 15
-                top_spends = all_transactions_df.sort_values(by=amount_col, ascending=False).head(15)
+            if args.top_since or args.top_until:
+                top_spends = query.top_spends(15, start=args.top_since, end=args.top_until)
+                top_title = f"Top 15 Spends ({args.top_since or 'start'} to {args.top_until or 'today'})"
+            else:
+                top_spends = query.top_spends(15, months=[sorted_months[-1]])
+                top_title = "Top 15 Spends"
 
+            if not top_spends.empty:
+                top_spends = top_spends.copy()
                 # Before preparing data for the table, format the date column
-                top_spends[date_col] = pd.to_datetime(
-                    top_spends[date_col], errors='coerce', dayfirst=True
-                ).dt.strftime('%d %b %Y')
-
-                # Prepare data for table
-                table_data = []
-                for _, row in top_spends.iterrows():
-                    desc = str(row[description_col])[:50]
-                    amt = f"{row[amount_col]:,.2f}"
-                    table_data.append([desc, amt])
-        
+                top_spends['date'] = top_spends['date'].dt.strftime('%d %b %Y')
+
                 fig = go.Figure(data=[go.Table(
                     header=dict(values=["Date", "Description", "Amount (INR)"], fill_color='paleturquoise', align='left'),
                     cells=dict(values=[
-                        top_spends[date_col].astype(str),
-                        top_spends[description_col].astype(str).str[:50],
-                        top_spends[amount_col].map('{:,.2f}'.format)
+                        top_spends['date'].astype(str),
+                        top_spends['description'].astype(str).str[:50],
+                        (top_spends['amount_paise'] / 100).map('{:,.2f}'.format)
                     ],
                     fill_color='lavender', align='left'))
                 ])
-                fig.update_layout(width=1000, height=40*len(top_spends)+100, title="Top 15 Spends")
+                fig.update_layout(width=1000, height=40*len(top_spends)+100, title=top_title)
                 fig.show()
             else:
-                print("Could not find the PDF file for the last month.")
+                print("No spends found for the top spends table.")
         
         print("\n--- Monthly Spends Summary ---")
-        print(f"{'Month':<15} | {'Swiggy':<10} | {'Zomato':<10} | {'Blinkit':<10}")
-        print("-" * 55)
-        for month_key in sorted_months:
-            year, month_num_str = month_key.split('-')
-            month_name = calendar.month_abbr[int(month_num_str)]
-            spends = monthly_spends_data[month_key]
-            print(f"{month_name} {year:<9} | {spends.get('Swiggy', 0):<10.2f} | {spends.get('Zomato', 0):<10.2f} | {spends.get('Blinkit', 0):<10.2f}")
+        print(f"{'Month':<15} | " + " | ".join(f"{category:<10}" for category in categories))
+        print("-" * (16 + 13 * len(categories)))
+        for month_key, display_month in zip(sorted_months, display_months):
+            spends = monthly_series.loc[month_key]
+            print(f"{display_month:<15} | " + " | ".join(f"{spends[category]:<10.2f}" for category in categories))
+
+        print("\n--- Change vs Previous Month ---")
+        changes = query.month_over_month(categories)
+        for month_key, display_month in zip(sorted_months[1:], display_months[1:]):
+            print(f"{display_month:<15} | " + " | ".join(f"{changes.loc[month_key, category]:<+10.2f}" for category in categories))
         
\ No newline at end of file
@@ -0,0 +1,349 @@
+"""
+Local HTTP service for submitting statements to the analyzer as they arrive.
+
+Statement PDFs are uploaded as the raw request body and queued to a bounded pool of
+worker processes running analyze_credit_card_statement. When the queue is full, uploads
+are turned away with 503 so callers back off instead of piling up work. Identical
+uploads (same file contents) share one job. Everything runs locally; nothing is sent
+over the network beyond the connection to this service.
+
+Endpoints:
+    POST /statements        Upload a PDF. Optional header X-Statement-Password.
+                            202 with the job for a new upload, 200 for a duplicate,
+                            503 when the queue is full, 413 when the file is too large.
+    GET  /jobs/<job_id>     The job's status: queued, running, done or failed. A failed
+                            job's error names the pipeline stage that failed and why.
+    GET  /jobs/<job_id>/result
+                            The spends per category (INR) once the job is done.
+    GET  /health            Queue depth and job counts.
+
+Usage:
+    python ingestion_service.py --port 8765 --workers 4 --queue-size 32
+    curl --data-binary @Jan_2025_StandardChartered.pdf -H 'Content-Type: application/pdf' \\
+         http://127.0.0.1:8765/statements
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+
+import credit_card_statement_analyzer as analyzer
+
+MAX_UPLOAD_BYTES = 50 * 1024 * 1024
+MAX_FINISHED_JOBS = 1000 # Finished jobs remembered for status and results; the oldest are forgotten first
+REQUEST_TIMEOUT = 30 # Seconds a client gets to send its request
+STATUS_REASONS = {
+    200: 'OK', 202: 'Accepted', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+    409: 'Conflict', 413: 'Payload Too Large', 503: 'Service Unavailable',
+}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class IngestionService:
+    """
+    Holds the job table, the bounded queue and the worker pool behind the HTTP endpoints.
+    """
+
+    def __init__(self, workers=None, queue_size=32, rules=None, extractors=None, spool_dir=None,
+                 max_upload_bytes=MAX_UPLOAD_BYTES, max_finished_jobs=MAX_FINISHED_JOBS):
+        """
+        Args:
+            workers (int, optional): Number of worker processes (defaults to the CPU count).
+            queue_size (int, optional): Uploads that may wait for a worker before new ones get 503.
+            rules (CategoryRules, optional): The categorization rules. Defaults to DEFAULT_CATEGORY_RULES.
+            extractors (list, optional): Extraction backends to try in order. Defaults to default_extractors().
+            spool_dir (str, optional): Where uploads wait for their turn. Defaults to a temporary directory.
+            max_upload_bytes (int, optional): Largest accepted upload.
+            max_finished_jobs (int, optional): Finished jobs kept before the oldest are forgotten.
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.rules = rules or analyzer.CategoryRules(analyzer.DEFAULT_CATEGORY_RULES)
+        self.extractors = extractors
+        self.spool_dir = spool_dir or tempfile.mkdtemp(prefix='statement-uploads-')
+        os.makedirs(self.spool_dir, exist_ok=True)
+        self.max_upload_bytes = max_upload_bytes
+        self.jobs = {} # {job_id: job dict}; the job id is the upload's SHA-256
+        self.finished = OrderedDict() # Finished job ids, oldest first
+        self.max_finished_jobs = max_finished_jobs
+        self.pool = None
+        self.consumers = []
+
+    def _new_pool(self):
+        # Workers must not be forked from this process: they would inherit the sockets of
+        # the connections open at the time, and those clients would never see the
+        # connection close. A forkserver (or spawn, where there is none) starts them clean.
+        method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context(method))
+
+    def start(self):
+        self.pool = self._new_pool()
+        self.consumers = [asyncio.create_task(self._consume()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for consumer in self.consumers:
+            consumer.cancel()
+        await asyncio.gather(*self.consumers, return_exceptions=True)
+        self.pool.shutdown(cancel_futures=True)
+
+    def submit(self, pdf_bytes, password=None):
+        """
+        Queues an uploaded statement, or returns the existing job for an identical upload.
+
+        Args:
+            pdf_bytes (bytes): The PDF file contents.
+            password (str, optional): The password for the PDF, if it's protected.
+
+        Returns:
+            tuple: (job, created) where created is False for a duplicate upload.
+
+        Raises:
+            HTTPError: 400 for something that isn't a PDF, 503 when the queue is full.
+        """
+        if not pdf_bytes.startswith(b'%PDF-'):
+            raise HTTPError(400, "The upload is not a PDF file")
+        job_id = hashlib.sha256(pdf_bytes).hexdigest()
+        job = self.jobs.get(job_id)
+        # A failed job (e.g. a wrong password) may be retried; anything else is a duplicate
+        if job is not None and job['status'] != 'failed':
+            return job, False
+        if self.queue.full():
+            raise HTTPError(503, "The ingestion queue is full, retry later")
+
+        pdf_path = os.path.join(self.spool_dir, f"{job_id}.pdf")
+        with open(pdf_path, 'wb') as f:
+            f.write(pdf_bytes)
+        job = {
+            'job_id': job_id,
+            'status': 'queued',
+            'submitted_at': time.time(),
+            'started_at': None,
+            'finished_at': None,
+            'error': None,
+            'result': None,
+        }
+        self.finished.pop(job_id, None)
+        self.jobs[job_id] = job
+        self.queue.put_nowait((job, pdf_path, password))
+        return job, True
+
+    async def _consume(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job, pdf_path, password = await self.queue.get()
+            job['status'] = 'running'
+            job['started_at'] = time.time()
+            pool = self.pool
+            try:
+                result, events = await loop.run_in_executor(
+                    pool, partial(analyze_recorded, pdf_path, password, self.rules, self.extractors))
+                if result is None:
+                    job['status'], job['error'] = 'failed', failure_reason(events)
+                else:
+                    job['status'], job['result'] = 'done', result
+            except BrokenProcessPool as e:
+                # A worker died (e.g. killed for memory); the pool won't take any more work,
+                # so replace it once rather than failing every later job
+                job['status'], job['error'] = 'failed', f"Worker process died: {e}"
+                if self.pool is pool:
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    self.pool = self._new_pool()
+            except Exception as e:
+                job['status'], job['error'] = 'failed', f"{type(e).__name__}: {e}"
+            finally:
+                job['finished_at'] = time.time()
+                self._forget_old_jobs(job['job_id'])
+                self.queue.task_done()
+                try:
+                    os.remove(pdf_path)
+                except FileNotFoundError:
+                    pass
+
+    def _forget_old_jobs(self, finished_job_id):
+        self.finished[finished_job_id] = None
+        while len(self.finished) > self.max_finished_jobs:
+            job_id, _ = self.finished.popitem(last=False)
+            self.jobs.pop(job_id, None)
+
+    def health(self):
+        counts = {}
+        for job in self.jobs.values():
+            counts[job['status']] = counts.get(job['status'], 0) + 1
+        return {'queued': self.queue.qsize(), 'queue_size': self.queue.maxsize, 'workers': self.workers, 'jobs': counts}
+
+    def route(self, method, path, headers, body):
+        """
+        Handles one parsed request.
+
+        Returns:
+            tuple: (status, JSON-serializable payload)
+        """
+        parts = [part for part in path.split('?', 1)[0].split('/') if part]
+        if parts == ['statements']:
+            if method != 'POST':
+                raise HTTPError(405, "Use POST to upload a statement")
+            job, created = self.submit(body, headers.get('x-statement-password') or None)
+            return (202 if created else 200), job_summary(job)
+        if method != 'GET':
+            raise HTTPError(405, f"{method} is not supported here")
+        if parts == ['health']:
+            return 200, self.health()
+        if len(parts) in (2, 3) and parts[0] == 'jobs' and (len(parts) == 2 or parts[2] == 'result'):
+            job = self.jobs.get(parts[1])
+            if job is None:
+                raise HTTPError(404, f"Unknown job {parts[1]}")
+            if len(parts) == 2:
+                return 200, job_summary(job)
+            if job['status'] != 'done':
+                raise HTTPError(409, f"Job {job['job_id']} is {job['status']}")
+            return 200, {'job_id': job['job_id'], 'spends': job['result']}
+        raise HTTPError(404, f"No such endpoint: {path}")
+
+    async def handle_connection(self, reader, writer):
+        try:
+            try:
+                method, path, headers, body = await asyncio.wait_for(
+                    read_request(reader, self.max_upload_bytes), REQUEST_TIMEOUT)
+                status, payload = self.route(method, path, headers, body)
+            except HTTPError as e:
+                status, payload = e.status, {'error': str(e)}
+            except asyncio.TimeoutError:
+                status, payload = 400, {'error': "Timed out reading the request"}
+            await write_response(writer, status, payload,
+                                 extra_headers={'Retry-After': '5'} if status == 503 else None)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass # The client went away; there's no one to answer
+        finally:
+            writer.close()
+
+
+def analyze_recorded(pdf_path, password=None, rules=None, extractors=None):
+    """
+    Runs analyze_credit_card_statement in a worker process with a StageRecorder, so the
+    job can tell why a statement failed and not just that it did.
+
+    Returns:
+        tuple: (spends per category or None, the stage events)
+    """
+    # Memory tracking would slow every job down for numbers nobody reads here
+    recorder = analyzer.StageRecorder(source=os.path.basename(pdf_path), track_memory=False)
+    result = analyzer.analyze_credit_card_statement(pdf_path, password, rules, extractors, recorder=recorder)
+    return result, recorder.events
+
+
+def failure_reason(events):
+    """
+    Describes why an analysis came back empty: the error of the stage that failed, if one did.
+    """
+    for event in events:
+        if event['status'] == 'error':
+            return f"{event['stage']} failed: {event['error']}"
+    return "No transactions could be extracted"
+
+
+def job_summary(job):
+    return {key: value for key, value in job.items() if key != 'result'}
+
+
+async def read_request(reader, max_body_bytes):
+    """
+    Reads a single HTTP/1.1 request. Only what this service needs is supported: a request
+    line, headers, and a body with a Content-Length.
+
+    Returns:
+        tuple: (method, path, headers with lower-cased names, body bytes)
+    """
+    request_line = (await reader.readline()).decode('latin-1').strip()
+    try:
+        method, path, _version = request_line.split(' ')
+    except ValueError:
+        raise HTTPError(400, "Malformed request line")
+
+    headers = {}
+    while True:
+        line = (await reader.readline()).decode('latin-1')
+        if line in ('\r\n', '\n', ''):
+            break
+        name, _, value = line.partition(':')
+        headers[name.strip().lower()] = value.strip()
+        if len(headers) > 100:
+            raise HTTPError(400, "Too many headers")
+
+    try:
+        length = int(headers.get('content-length', 0))
+    except ValueError:
+        raise HTTPError(400, "Invalid Content-Length")
+    if length > max_body_bytes:
+        raise HTTPError(413, f"Uploads are limited to {max_body_bytes} bytes")
+    body = await reader.readexactly(length) if length else b''
+    return method.upper(), path, headers, body
+
+
+async def write_response(writer, status, payload, extra_headers=None):
+    body = json.dumps(payload, indent=2).encode('utf-8')
+    head = [
+        f"HTTP/1.1 {status} {STATUS_REASONS.get(status, '')}",
+        "Content-Type: application/json",
+        f"Content-Length: {len(body)}",
+        "Connection: close",
+    ] + [f"{name}: {value}" for name, value in (extra_headers or {}).items()]
+    writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body)
+    await writer.drain()
+
+
+async def serve(host, port, service):
+    service.start()
+    server = await asyncio.start_server(service.handle_connection, host, port)
+    print(f"Accepting statements on http://{host}:{port}/statements "
+          f"({service.workers} workers, queue of {service.queue.maxsize})")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local HTTP service that analyzes uploaded statement PDFs.")
+    parser.add_argument('--host', default='127.0.0.1', help="Address to listen on (default: 127.0.0.1)")
+    parser.add_argument('--port', type=int, default=8765, help="Port to listen on (default: 8765)")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Number of statements to analyze in parallel (defaults to the CPU count)")
+    parser.add_argument('--queue-size', type=int, default=32,
+                        help="Uploads that may wait for a worker before new ones are refused with 503 (default: 32)")
+    parser.add_argument('--rules', default=None,
+                        help="CSV rule table (pattern,category,priority[,regex]); defaults to Swiggy, Zomato and Blinkit")
+    parser.add_argument('--extractor', choices=['auto', 'text', 'camelot'], default='auto',
+                        help="Transaction extraction backend, as for credit_card_statement_analyzer.py (default: auto)")
+    parser.add_argument('--max-finished-jobs', type=int, default=MAX_FINISHED_JOBS,
+                        help=f"Finished jobs kept for status and result queries (default: {MAX_FINISHED_JOBS})")
+    parser.add_argument('--spool-dir', default=None,
+                        help="Where uploads wait to be analyzed (defaults to a temporary directory)")
+    args = parser.parse_args()
+
+    rules = analyzer.load_category_rules(args.rules) if args.rules else None
+    extractors = {
+        'auto': None,
+        'text': [analyzer.TextLayerExtractor()],
+        'camelot': [analyzer.CamelotExtractor()],
+    }[args.extractor]
+
+    try:
+        asyncio.run(serve(args.host, args.port, IngestionService(args.workers, args.queue_size, rules, extractors,
+                                                                 args.spool_dir,
+                                                                 max_finished_jobs=args.max_finished_jobs)))
+    except KeyboardInterrupt:
+        print("Stopped.")
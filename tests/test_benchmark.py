@@ -0,0 +1,26 @@
+import benchmark
+
+
+def _results(**stages):
+    return {'runs': [{'pages': 1, 'rows_per_page': 30,
+                      'stages': {stage: {'median_s': min_s * 2, 'min_s': min_s, 'runs': 5}
+                                 for stage, min_s in stages.items()}}]}
+
+
+def test_small_absolute_slowdowns_are_not_regressions():
+    baseline = _results(top_n=0.001, extraction=0.200)
+    # Twice as slow, but only by a millisecond
+    assert benchmark.compare_to_baseline(_results(top_n=0.002, extraction=0.210), baseline, 0.25) == []
+    regressions = benchmark.compare_to_baseline(_results(top_n=0.002, extraction=0.300), baseline, 0.25)
+    assert len(regressions) == 1 and regressions[0].startswith("extraction (1 pages x 30 rows)")
+    assert len(benchmark.compare_to_baseline(_results(top_n=0.002), baseline, 0.25, min_delta_s=0)) == 1
+
+
+def test_stages_missing_from_the_baseline_are_skipped():
+    assert benchmark.compare_to_baseline(_results(text_extraction=1.0), _results(extraction=0.2), 0.25) == []
+
+
+def test_text_layer_extraction_is_benchmarked(tmp_path):
+    run = benchmark.benchmark_statement(2, 10, repeat=1, skip_extraction=True, workdir=str(tmp_path))
+    assert 'text_extraction' in run['stages'] and 'extraction' not in run['stages']
+    assert run['transactions'] == 20
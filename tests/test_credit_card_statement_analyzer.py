@@ -0,0 +1,354 @@
+import os
+import random
+import string
+import time
+
+import pandas as pd
+import pytest
+
+import credit_card_statement_analyzer as analyzer
+
+
+# --- Extraction backends ---
+
+class _FakePage:
+    def __init__(self, text):
+        self.text = text
+
+    def extract_text(self):
+        return self.text
+
+
+def _text_layer(monkeypatch, *page_texts):
+    reader = type('FakeReader', (), {'pages': [_FakePage(text) for text in page_texts]})
+    monkeypatch.setattr(analyzer, '_open_pdf', lambda pdf_path, password=None: reader)
+
+
+def test_text_layer_extractor_parses_transaction_lines(monkeypatch):
+    _text_layer(monkeypatch, "Statement for Jan 2025\n"
+                             "Date Transaction Details Amount\n"
+                             "02/01/2025 SWIGGY BANGALORE 1,250.50\n"
+                             "03-01-2025 PAYMENT RECEIVED - THANK YOU 5,000.00 Cr\n",
+                "Rewards summary\n")
+    chunks = analyzer.TextLayerExtractor().extract_chunks('Jan_2025_CardA.pdf')
+    assert [row for chunk in chunks for row in chunk.values.tolist()] == [
+        ["02/01/2025", "SWIGGY BANGALORE", "1,250.50"],
+        ["03-01-2025", "PAYMENT RECEIVED - THANK YOU", "5,000.00 Cr"],
+    ]
+
+
+def test_text_layer_extractor_falls_back_on_a_running_balance_column(monkeypatch):
+    # The last amount is the balance, which would leave the real amount in the description
+    _text_layer(monkeypatch, "Date Transaction Details Amount Balance\n"
+                             "02/01/2025 SWIGGY BANGALORE 1,250.50 11,250.50\n"
+                             "04/01/2025 ZOMATO GURGAON 300.00 11,550.50\n")
+    assert analyzer.TextLayerExtractor().extract_chunks('Jan_2025_CardA.pdf') is None
+
+
+def test_text_layer_extractor_refuses_separate_debit_and_credit_columns(monkeypatch):
+    _text_layer(monkeypatch, "Your credit card statement\n"
+                             "Date Transaction Details Debit Credit\n"
+                             "02/01/2025 SWIGGY BANGALORE 1,250.50\n"
+                             "03/01/2025 PAYMENT RECEIVED 5,000.00\n")
+    metrics = {}
+    assert analyzer.TextLayerExtractor().extract_chunks('Jan_2025_CardA.pdf', metrics=metrics) is None
+    assert metrics['debit_credit_columns'] == 1
+
+
+def test_text_layer_extractor_needs_most_dated_lines_to_parse(monkeypatch):
+    _text_layer(monkeypatch, "02/01/2025 SWIGGY BANGALORE 1,250.50\n"
+                             "03/01/2025 continued on the next page\n")
+    assert analyzer.TextLayerExtractor().extract_chunks('Jan_2025_CardA.pdf') is None
+    assert analyzer.TextLayerExtractor(min_match_ratio=0.5).extract_chunks('Jan_2025_CardA.pdf') is not None
+
+
+# --- Page pre-screening ---
+
+def test_a_short_continuation_page_qualifies():
+    text = ("Transactions (continued)\n"
+            "28/01/2025 SWIGGY BANGALORE 1,250.50\n"
+            "29/01/2025 BLINKIT GURGAON 310.00\n")
+    score = analyzer.score_page_text(text)
+    assert score['dated_amount_lines'] == 2 and score['qualifies']
+
+
+def test_a_cover_page_does_not_qualify():
+    text = ("Statement Date 15/01/2025\n"
+            "Payment Due Date 05/02/2025\n"
+            "Credit Limit 3,00,000.00\n"
+            "Transaction Amount Due Description\n"
+            "Total Amount Due 12,345.00\n"
+            "Minimum Amount Due 620.00\n")
+    score = analyzer.score_page_text(text)
+    assert score['dates'] == 2 and score['amounts'] == 3
+    assert score['dated_amount_lines'] == 0 and not score['qualifies']
+
+
+def test_screening_examines_every_page_when_none_qualifies(monkeypatch):
+    _text_layer(monkeypatch, "Statement Date 15/01/2025\nTotal Amount Due 12,345.00",
+                "02/01/2025 SWIGGY BANGALORE 1,250.50", "Terms and conditions")
+    assert analyzer.screen_transaction_pages('Jan_2025_CardA.pdf') == [2]
+    _text_layer(monkeypatch, "Statement Date 15/01/2025\nTotal Amount Due 12,345.00", "")
+    assert analyzer.screen_transaction_pages('Jan_2025_CardA.pdf') is None
+
+
+# --- Schema inference ---
+
+def _lattice_table(transaction_rows=3):
+    rows = [["Date", "Transaction Details", "", "", "", "", "Amount (Rs.)"]]
+    for day in range(1, transaction_rows + 1):
+        rows.append([f"{day:02d}/01/2025", f"SWIGGY BANGALORE {day}", "", "", "", "", f"{day * 100}.00"])
+    return pd.DataFrame(rows)
+
+
+def test_infer_columns_finds_date_description_and_amount():
+    rules = analyzer.CategoryRules(analyzer.DEFAULT_CATEGORY_RULES)
+    table = _lattice_table()[[6, 0, 1]] # Shuffled away from the default positions
+    assert analyzer.infer_columns(table, rules) == {'date': 0, 'description': 1, 'amount': 6}
+
+
+def test_layout_fingerprint_depends_on_shape_header_and_issuer():
+    table = _lattice_table()
+    assert analyzer.layout_fingerprint(table, 'CardA') == analyzer.layout_fingerprint(_lattice_table(10), 'CardA')
+    assert analyzer.layout_fingerprint(table, 'CardA') != analyzer.layout_fingerprint(table, 'CardB')
+    assert analyzer.layout_fingerprint(table, 'CardA') != analyzer.layout_fingerprint(table[[0, 1, 6]], 'CardA')
+
+
+def test_layout_registry_round_trip(tmp_path, monkeypatch):
+    rules = analyzer.CategoryRules(analyzer.DEFAULT_CATEGORY_RULES)
+    registry_path = str(tmp_path / 'layouts.json')
+    expected = {'date': 0, 'description': 1, 'amount': 6}
+    assert analyzer.resolve_columns(_lattice_table(), rules, 'CardA', registry_path) == expected
+    assert os.path.exists(registry_path)
+
+    # A known layout comes from the registry without inferring anything
+    monkeypatch.setattr(analyzer, 'infer_columns', lambda *args: pytest.fail("inferred a known layout"))
+    assert analyzer.resolve_columns(_lattice_table(5), rules, 'CardA', registry_path) == expected
+
+    analyzer.reset_layout_registry(registry_path)
+    analyzer.reset_layout_registry(registry_path) # Resetting twice is fine
+    assert not os.path.exists(registry_path)
+
+
+def test_resolve_columns_without_a_registry_always_infers(tmp_path, monkeypatch):
+    rules = analyzer.CategoryRules(analyzer.DEFAULT_CATEGORY_RULES)
+    monkeypatch.chdir(tmp_path)
+    assert analyzer.resolve_columns(_lattice_table(), rules, 'CardA', None) == {'date': 0, 'description': 1, 'amount': 6}
+    assert os.listdir(tmp_path) == []
+
+
+# --- CategoryRules ---
+
+def test_default_rules_categorize_descriptions():
+    rules = analyzer.CategoryRules(analyzer.DEFAULT_CATEGORY_RULES)
+    assert rules.category_of("SWIGGY*INSTAMART BANGALORE IN") == "Swiggy"
+    assert rules.category_of("zomato online order") == "Zomato"
+    assert rules.category_of("NETFLIX.COM") is None
+
+
+def test_higher_priority_rule_wins_when_matches_overlap():
+    rules = analyzer.CategoryRules([
+        ("PRIME VIDEO", "Entertainment", 1, False),
+        ("AMAZON PRIME", "Shopping", 2, False),
+    ])
+    # AMAZON PRIME starts earlier and overlaps PRIME VIDEO, but has the lower priority
+    assert rules.category_of("AMAZON PRIME VIDEO") == "Entertainment"
+    assert rules.category_of("AMAZON PRIME MEMBERSHIP") == "Shopping"
+
+
+def test_plain_patterns_are_escaped_and_regex_patterns_are_not():
+    rules = analyzer.CategoryRules([
+        ("NETFLIX.COM", "Entertainment", 1, False),
+        ("^AMZN|AMAZON", "Shopping", 2, True),
+    ])
+    assert rules.category_of("NETFLIX.COM 4979315673") == "Entertainment"
+    assert rules.category_of("NETFLIXXCOM") is None
+    assert rules.category_of("AMZN MKTP IN") == "Shopping"
+    assert rules.category_of("PAY AMZN") is None
+
+
+def test_regex_rules_are_ranked_together_with_keywords():
+    rules = analyzer.CategoryRules([
+        ("swiggy", "Swiggy", 2, False),
+        (r"INSTAMART|GENIE", "Groceries", 1, True),
+        ("SWIGGY", "Duplicate", 3, False),
+    ])
+    assert rules.category_of("SWIGGY*INSTAMART BANGALORE") == "Groceries"
+    assert rules.category_of("Swiggy Food") == "Swiggy"
+
+
+def test_categorization_cost_does_not_blow_up_with_the_rule_count():
+    rng = random.Random(0)
+    merchants = [''.join(rng.choice(string.ascii_uppercase) for _ in range(8)) for _ in range(600)]
+    rules = analyzer.CategoryRules([(m, f"Category {i}", i, False) for i, m in enumerate(merchants[:500])])
+    descriptions = pd.Series([f"{rng.choice(merchants)} MUMBAI IN {rng.randint(10 ** 9, 10 ** 10)}"
+                              for _ in range(5000)])
+    start = time.perf_counter()
+    categories = rules.categorize(descriptions)
+    # One group per rule took tens of seconds here; a single keyword pass takes a fraction of one
+    assert time.perf_counter() - start < 2
+    assert categories.notna().mean() > 0.7
+
+
+def test_categorize_handles_categoricals_and_missing_descriptions():
+    rules = analyzer.CategoryRules(analyzer.DEFAULT_CATEGORY_RULES)
+    descriptions = pd.Series(["BLINKIT GURGAON", None, "UBER TRIP", "BLINKIT GURGAON"], index=[5, 6, 7, 8],
+                             dtype='category')
+    categories = rules.categorize(descriptions)
+    assert list(categories.index) == [5, 6, 7, 8]
+    assert categories[5] == "Blinkit" and categories[8] == "Blinkit"
+    assert pd.isna(categories[6]) and pd.isna(categories[7])
+
+
+def test_totals_are_exact_and_cover_every_category():
+    rules = analyzer.CategoryRules(analyzer.DEFAULT_CATEGORY_RULES)
+    descriptions = pd.Series(["SWIGGY", "SWIGGY", "UBER"])
+    amounts = pd.Series([10, 20, 500], dtype='int64') # 0.10 + 0.20 must not become 0.30000000000000004
+    assert rules.totals(descriptions, amounts) == {"Swiggy": 0.3, "Zomato": 0.0, "Blinkit": 0.0}
+
+
+# --- Canonical transaction table ---
+
+def test_parse_amounts():
+    parsed = analyzer.parse_amounts(pd.Series(["1,234.50", "₹ 99.00 Cr", "-12.3", "Rs. 1,00,000", "Amount", None]))
+    assert parsed['amount_paise'].tolist()[:4] == [123450, 9900, 1230, 10000000]
+    assert parsed['amount_paise'].isna().tolist()[4:] == [True, True]
+    assert parsed['is_credit'].tolist() == [False, True, True, False, False, False]
+
+
+# --- TransactionLedger ---
+
+def _statement_table(amounts_paise):
+    return analyzer.build_transaction_table(
+        pd.Series(["05/01/2025"] * len(amounts_paise)),
+        pd.Series(["SWIGGY BANGALORE"] * len(amounts_paise)),
+        pd.Series([f"{paise // 100}.{paise % 100:02d}" for paise in amounts_paise]))
+
+
+def test_ledger_keeps_folders_apart():
+    rules = analyzer.CategoryRules(analyzer.DEFAULT_CATEGORY_RULES)
+    with analyzer.TransactionLedger(':memory:') as ledger:
+        ledger.add_statement('/a', 'hash-a', 'Jan_2025_X.pdf', '2025-01', _statement_table([1000]), rules)
+        ledger.add_statement('/b', 'hash-b', 'Feb_2025_X.pdf', '2025-02', _statement_table([2050]), rules)
+        assert ledger.monthly_spends(rules.categories, '/a') == {'2025-01': {'Swiggy': 10.0, 'Zomato': 0.0, 'Blinkit': 0.0}}
+        assert list(ledger.monthly_spends(rules.categories, '/b')) == ['2025-02']
+        assert ledger.monthly_spends(rules.categories, '/empty') == {}
+        assert len(ledger.transactions_frame('/a')) == 1 and len(ledger.transactions_frame()) == 2
+
+
+def test_ledger_adding_a_statement_twice_does_not_double_it():
+    rules = analyzer.CategoryRules(analyzer.DEFAULT_CATEGORY_RULES)
+    with analyzer.TransactionLedger(':memory:') as ledger:
+        for filename in ('Jan_2025_X.pdf', 'Jan_2025_X (1).pdf'):
+            ledger.add_statement('/a', 'same-hash', filename, '2025-01', _statement_table([1000, 500]), rules)
+        assert ledger.monthly_spends(rules.categories, '/a')['2025-01']['Swiggy'] == 15.0
+        assert len(ledger.transactions_frame('/a')) == 2
+
+
+def test_ledger_prunes_statements_that_left_the_folder():
+    rules = analyzer.CategoryRules(analyzer.DEFAULT_CATEGORY_RULES)
+    with analyzer.TransactionLedger(':memory:') as ledger:
+        ledger.add_statement('/a', 'hash-jan', 'Jan_2025_X.pdf', '2025-01', _statement_table([1000]), rules)
+        ledger.add_statement('/a', 'hash-feb', 'Feb_2025_X.pdf', '2025-02', _statement_table([2000]), rules)
+        assert ledger.prune_statements('/a', {'hash-feb'}) == ['Jan_2025_X.pdf']
+        assert list(ledger.monthly_spends(rules.categories, '/a')) == ['2025-02']
+
+
+def test_ingest_skips_identical_copies_in_one_batch(tmp_path, monkeypatch):
+    for filename in ('Jan_2025_X.pdf', 'Jan_2025_X (1).pdf'):
+        (tmp_path / filename).write_bytes(b'%PDF-1.4 same statement')
+    monkeypatch.setattr(analyzer, 'extract_statement_transactions',
+                        lambda pdf_path, *args, **kwargs: _statement_table([1000]))
+    rules = analyzer.CategoryRules(analyzer.DEFAULT_CATEGORY_RULES)
+    with analyzer.TransactionLedger(':memory:') as ledger:
+        ingested, failures = analyzer.ingest_statements_folder(str(tmp_path), ledger, workers=1, rules=rules)
+        assert len(ingested) == 1 and not failures
+        assert ledger.monthly_spends(rules.categories, str(tmp_path))['2025-01']['Swiggy'] == 10.0
+
+
+# --- MerchantNormalizer ---
+
+def test_canonical_name_strips_prefixes_locations_and_references():
+    normalizer = analyzer.MerchantNormalizer()
+    assert normalizer.canonical_name("SWIGGY*INSTAMART BANGALORE IN") == "SWIGGY INSTAMART"
+    assert normalizer.canonical_name("PAYU*SWIGGY FOOD BANGALORE") == "SWIGGY"
+    assert normalizer.canonical_name("NETFLIX.COM 4979315673") == "NETFLIX"
+    assert normalizer.canonical_name("RAZ*DECATHLON SPORTS PUNE IN") == "DECATHLON SPORTS"
+    assert normalizer.canonical_name("IRCTC REF NO 12345678 NEW DELHI") == "IRCTC"
+    assert normalizer.canonical_name("UBER EATS MUMBAI") == "UBER EATS"
+
+
+def test_normalizer_cache_is_bounded_and_counts_hits():
+    normalizer = analyzer.MerchantNormalizer(max_size=2)
+    merchants = normalizer.normalize_series(pd.Series(["ZOMATO GURGAON", "SWIGGY", None, "ZOMATO GURGAON"]))
+    assert merchants.tolist()[:2] == ["ZOMATO", "SWIGGY"] and pd.isna(merchants[2])
+    assert (normalizer.hits, normalizer.misses) == (0, 2) # Distinct descriptions are looked up once
+    normalizer.normalize("BLINKIT GURGAON")
+    assert len(normalizer.cache) == 2 and "ZOMATO GURGAON" not in normalizer.cache
+    normalizer.normalize("BLINKIT GURGAON")
+    assert normalizer.hits == 1
+
+
+def test_normalizer_cache_hits_across_reference_numbers():
+    normalizer = analyzer.MerchantNormalizer()
+    descriptions = [f"NETFLIX.COM {random.randrange(10 ** 9, 10 ** 10)} mumbai  IN" for _ in range(50)]
+    assert {normalizer.normalize(description) for description in descriptions} == {"NETFLIX"}
+    assert (normalizer.hits, normalizer.misses) == (49, 1)
+    # Short digit runs are part of the name and stay apart
+    assert normalizer.normalize("PVR 12 SCREENS") != normalizer.normalize("PVR 34 SCREENS")
+    assert normalizer.canonical_name("IRCTC REF NO 12345678") == normalizer.normalize("IRCTC REF NO 87654321")
+
+
+def test_normalizer_with_no_cache_size_keeps_nothing(tmp_path):
+    cache_path = str(tmp_path / 'merchants.json')
+    first = analyzer.MerchantNormalizer(cache_path=cache_path)
+    first.normalize("BLINKIT GURGAON IN")
+    first.save()
+    uncached = analyzer.MerchantNormalizer(max_size=0, cache_path=cache_path)
+    assert not uncached.cache
+    assert uncached.normalize("BLINKIT GURGAON IN") == "BLINKIT" and not uncached.cache
+
+
+def test_normalizer_cache_persists(tmp_path):
+    cache_path = str(tmp_path / 'merchants.json')
+    first = analyzer.MerchantNormalizer(cache_path=cache_path)
+    first.normalize("BLINKIT GURGAON IN")
+    first.save()
+    second = analyzer.MerchantNormalizer(cache_path=cache_path)
+    assert second.normalize("BLINKIT GURGAON IN") == "BLINKIT" and second.hits == 1
+
+
+def test_rules_match_raw_descriptions_before_merchant_names():
+    rules = analyzer.CategoryRules([
+        ("UBER EATS", "Food", 1, False),
+        ("AMAZON PAY", "Wallet", 2, False),
+        ("BUNDL", "Swiggy", 3, False),
+        ("SWIGGY", "Swiggy", 3, False),
+    ])
+    descriptions = pd.Series(["UBER EATS INDIA 123456", "AMAZON PAY INDIA PRIVATE", "BUNDL TECHNOLOGIES",
+                              "PAYU*SWIGGY FOOD"])
+    merchants = analyzer.MerchantNormalizer(aliases=[(r'^UBER', 'UBER'), (r'^AMAZON', 'AMAZON')]) \
+        .normalize_series(descriptions)
+    assert rules.categorize(descriptions, merchants).tolist() == ["Food", "Wallet", "Swiggy", "Swiggy"]
+    # Only the merchant name carries the match here
+    alias_rules = analyzer.CategoryRules([("^SWIGGY$", "Swiggy", 1, True)])
+    merchants = analyzer.MerchantNormalizer().normalize_series(descriptions)
+    assert alias_rules.categorize(descriptions, merchants).tolist()[2:] == ["Swiggy", "Swiggy"]
+    assert alias_rules.categorize(descriptions).isna().all()
+
+
+# --- Batch analysis ---
+
+def test_statements_of_the_same_month_are_added_up(tmp_path, monkeypatch):
+    for filename in ('Feb_2025_CardA.pdf', 'Feb_2025_CardB.pdf', 'Mar_2025_CardA.pdf'):
+        (tmp_path / filename).write_bytes(b'%PDF-1.4')
+    spends = {
+        'Feb_2025_CardA.pdf': {'Swiggy': 100.1, 'Zomato': 0.0},
+        'Feb_2025_CardB.pdf': {'Swiggy': 0.2, 'Zomato': 50.0},
+        'Mar_2025_CardA.pdf': {'Swiggy': 1.0, 'Zomato': 2.0},
+    }
+    monkeypatch.setattr(analyzer, 'analyze_credit_card_statement',
+                        lambda pdf_path, *args, **kwargs: spends[os.path.basename(pdf_path)])
+    monthly, failures = analyzer.analyze_statements_folder(str(tmp_path), workers=1)
+    assert not failures
+    assert monthly == {'2025-02': {'Swiggy': 100.3, 'Zomato': 50.0}, '2025-03': {'Swiggy': 1.0, 'Zomato': 2.0}}
@@ -0,0 +1,131 @@
+import asyncio
+
+import pytest
+
+import ingestion_service
+from ingestion_service import HTTPError, IngestionService
+
+PDF = b'%PDF-1.4 statement one'
+OTHER_PDF = b'%PDF-1.4 statement two'
+
+
+def _service(tmp_path, **kwargs):
+    # The queue and the pool are only needed once the service starts; submit and route work without
+    return IngestionService(workers=1, spool_dir=str(tmp_path), **kwargs)
+
+
+def _read(raw, max_body_bytes=1024):
+    async def read():
+        reader = asyncio.StreamReader()
+        reader.feed_data(raw)
+        reader.feed_eof()
+        return await ingestion_service.read_request(reader, max_body_bytes)
+    return asyncio.run(read())
+
+
+# --- submit ---
+
+def test_submit_rejects_uploads_that_are_not_pdfs(tmp_path):
+    with pytest.raises(HTTPError) as error:
+        _service(tmp_path).submit(b'<html>')
+    assert error.value.status == 400
+
+
+def test_identical_uploads_share_a_job(tmp_path):
+    service = _service(tmp_path)
+    job, created = service.submit(PDF)
+    duplicate, created_again = service.submit(PDF)
+    assert created and not created_again and duplicate is job
+    assert service.queue.qsize() == 1
+
+
+def test_a_failed_job_can_be_retried(tmp_path):
+    service = _service(tmp_path)
+    job, _ = service.submit(PDF)
+    service.queue.get_nowait()
+    job['status'] = 'failed'
+    retry, created = service.submit(PDF, password='secret')
+    assert created and retry is not job and retry['status'] == 'queued'
+    assert service.queue.get_nowait()[2] == 'secret'
+
+
+def test_a_full_queue_turns_uploads_away(tmp_path):
+    service = _service(tmp_path, queue_size=1)
+    service.submit(PDF)
+    with pytest.raises(HTTPError) as error:
+        service.submit(OTHER_PDF)
+    assert error.value.status == 503
+    assert service.submit(PDF)[1] is False # Duplicates are still answered
+
+
+# --- route ---
+
+def test_route_uploads_and_reports_jobs(tmp_path):
+    service = _service(tmp_path)
+    status, job = service.route('POST', '/statements', {'x-statement-password': ''}, PDF)
+    assert status == 202 and 'result' not in job
+    assert service.route('POST', '/statements', {}, PDF)[0] == 200
+    assert service.route('GET', f"/jobs/{job['job_id']}?verbose=1", {}, b'') == (200, job)
+
+    with pytest.raises(HTTPError) as error:
+        service.route('GET', f"/jobs/{job['job_id']}/result", {}, b'')
+    assert error.value.status == 409
+    service.jobs[job['job_id']].update(status='done', result={'Swiggy': 12.5})
+    assert service.route('GET', f"/jobs/{job['job_id']}/result", {}, b'')[1] == {
+        'job_id': job['job_id'], 'spends': {'Swiggy': 12.5}}
+    assert service.route('GET', '/health', {}, b'')[1]['jobs'] == {'done': 1}
+
+
+@pytest.mark.parametrize('method, path, status', [
+    ('GET', '/statements', 405),
+    ('DELETE', '/jobs/abc', 405),
+    ('GET', '/jobs/unknown', 404),
+    ('GET', '/jobs/unknown/status', 404),
+    ('GET', '/', 404),
+])
+def test_route_errors(tmp_path, method, path, status):
+    with pytest.raises(HTTPError) as error:
+        _service(tmp_path).route(method, path, {}, b'')
+    assert error.value.status == status
+
+
+# --- read_request ---
+
+def test_read_request_parses_the_request_line_headers_and_body():
+    method, path, headers, body = _read(b"post /statements HTTP/1.1\r\nHost: localhost\r\n"
+                                        b"X-Statement-Password: secret\r\nContent-Length: 4\r\n\r\nabcdextra")
+    assert (method, path, body) == ('POST', '/statements', b'abcd')
+    assert headers['x-statement-password'] == 'secret'
+
+
+@pytest.mark.parametrize('raw, status', [
+    (b"GARBAGE\r\n\r\n", 400),
+    (b"POST /statements HTTP/1.1\r\nContent-Length: lots\r\n\r\n", 400),
+    (b"POST /statements HTTP/1.1\r\nContent-Length: 2048\r\n\r\n", 413),
+])
+def test_read_request_rejects_bad_requests(raw, status):
+    with pytest.raises(HTTPError) as error:
+        _read(raw)
+    assert error.value.status == status
+
+
+# --- Running jobs ---
+
+def test_a_failed_job_carries_the_failing_stage(tmp_path):
+    async def run():
+        service = _service(tmp_path)
+        service.pool = None # Run the job on the event loop's default thread pool instead
+        job, _ = service.submit(PDF) # Not a readable PDF past its first bytes
+        consumer = asyncio.create_task(service._consume())
+        await service.queue.join()
+        consumer.cancel()
+        return job
+    job = asyncio.run(run())
+    assert job['status'] == 'failed'
+    assert job['error'].startswith("extraction failed: ")
+    assert not list(tmp_path.iterdir()) # The spooled upload is cleaned up
+
+
+def test_failure_reason_without_a_failed_stage():
+    events = [{'stage': 'extraction', 'status': 'ok'}]
+    assert ingestion_service.failure_reason(events) == "No transactions could be extracted"